@@ -6,10 +6,14 @@
 """
 
 import os
+import logging
 os.sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from occilib.CadLibrary import CadLibrary
 
+logging.basicConfig(format='%(asctime)s %(name)s %(levelname)-4s %(message)s')
+logging.getLogger('occilib').setLevel(logging.INFO)
+
 lib = CadLibrary()
 print (lib._load_scripts_dir())
 #lib._print_library_overview()
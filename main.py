@@ -1,8 +1,13 @@
 import os
+import uuid
+import logging
+import orjson
 import uvicorn as uvicorn
 from starlette.responses import RedirectResponse
 from fastapi import FastAPI, HTTPException, Depends, Response, status
-from celery.result import AsyncResult
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+from celery import states
 
 from typing import List, Dict
 
@@ -10,31 +15,44 @@ from occilib.CadLibrary import CadLibrary
 from occilib.CadScript import CadScriptResult
 from occilib.ApiGenerator import ApiGenerator
 from occilib.models import SearchQueryInput
+from occilib.celery_tasks import celery as celery_app
+
+#### LOGGING ####
+# configured once for the app: the occilib classes only get their module loggers
+logging.basicConfig(format='%(asctime)s %(name)s %(levelname)-4s %(message)s')
+logging.getLogger('occilib').setLevel(logging.INFO)
 
 library = CadLibrary('./scriptlibrary')
 scripts = library.scripts
 api_generator = ApiGenerator(library)
 
+def get_library() -> CadLibrary:
+    """ Library singleton for endpoints. Use app.dependency_overrides to plug in another one """
+    return library
+
 #### CHECK CONNECTION TO RMQ ####
 
 if api_generator.request_handler.check_celery() is False:
     raise Exception('*** RESTART API - No Celery connection and/or missing workers: Restart API ****') 
 
-app = FastAPI(openapi_tags=api_generator.get_api_tags(scripts))
+app = FastAPI(openapi_tags=api_generator.get_api_tags(scripts), default_response_class=ORJSONResponse)
 api_generator.generate_endpoints(api=app, scripts=scripts)
 
+# library info does not change while running: serialize once
+INDEX_RESPONSE_JSON = orjson.dumps({
+    'library': os.environ.get('OCCI_LIBRARY_NAME', 'unnamed OCCI library. See settings in .env'),
+    'maintainer': os.environ.get('OCCI_LIBRARY_MAINTAINER'),
+    'maintainer_email': os.environ.get('OCCI_LIBRARY_MAINTAINER_EMAIL'),
+})
+
 @app.get("/")
 async def index():
-    return {
-        'library': os.environ.get('OCCI_LIBRARY_NAME', 'unnamed OCCI library. See settings in .env'),
-        'maintainer': os.environ.get('OCCI_LIBRARY_MAINTAINER'),
-        'maintainer_email': os.environ.get('OCCI_LIBRARY_MAINTAINER_EMAIL'),
-    }
+    return Response(content=INDEX_RESPONSE_JSON, media_type='application/json')
 
 #### COMPUTING JOB STATUS ####
 
 @app.get('/{script_org}/{script_name}/{script_instance_hash}/job/{celery_task_id}')
-async def get_model_compute_task(script_name:str, script_instance_hash:str, celery_task_id:str, response: Response):
+async def get_model_compute_task(script_name:str, script_instance_hash:str, celery_task_id:str, library:CadLibrary=Depends(get_library)):
     """
         If a compute takes longer then a defined time (see ModelRequestHandler.WAIT_FOR_COMPUTE_RESULT_UNTILL_REDIRECT)
         The user is redirected to this url which supplies information on the job
@@ -51,49 +69,60 @@ async def get_model_compute_task(script_name:str, script_instance_hash:str, cele
         If the compute is done the .compute file is cleaned automatically
     """
     
-    celery_task_result:AsyncResult = AsyncResult(celery_task_id)
+    # Celery task ids are uuids: don't bother the result backend with anything else
+    try:
+        uuid.UUID(celery_task_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Compute task not found or in error state. Please go back to original request url!")
+
+    # get state and result in one call to the result backend
+    celery_task_meta = celery_app.backend.get_task_meta(celery_task_id)
+    celery_task_status = celery_task_meta['status']
 
-    if celery_task_result.state in ['PENDING', 'FAILURE']: # pending means unknown because we directly set state to SEND (see ModelRequestHandler.setup_celery_publish_status())
+    if celery_task_status in ['PENDING', 'FAILURE']: # pending means unknown because we directly set state to SEND (see ModelRequestHandler.setup_celery_publish_status())
         raise HTTPException(status_code=404, detail="Compute task not found or in error state. Please go back to original request url!")
 
-    elif celery_task_result.ready():
+    elif celery_task_status in states.READY_STATES:
         '''
         NOTE: we lean on the Celery result system to have cache for 'infinite' script variants
          results are automatically reset after one day: https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-result_expires
         ''' 
-        script_result_dict = celery_task_result.result
-        script_result = CadScriptResult(**script_result_dict)
-        library._apply_single_model_format(script_result)
+        script_result_dict = celery_task_meta['result']
+        # parsing and formatting big models is kept off the event loop
+        script_result = await run_in_threadpool(CadScriptResult.parse_obj, script_result_dict)
+        await run_in_threadpool(library._apply_single_model_format, script_result)
         
-        return script_result.dict() # output as dict
+        return Response(content=script_result.json(), media_type='application/json') # serialize once, don't parse the content again
     else:
         # the job info we can get from a temporary file (.compute) in directory
-        job = library.check_script_model_computing_job(script_name, script_instance_hash)
+        job = await run_in_threadpool(library.check_script_model_computing_job, script_name, script_instance_hash)
         if not job:
            raise HTTPException(status_code=404, detail="Compute task not found or in error state. Please go back to original request url!") 
-        job.celery_task_status = celery_task_result.status
+        job.celery_task_status = celery_task_status
         
-        response.status_code = status.HTTP_202_ACCEPTED # special code to signify the job is still being processed
-        return job.dict() # return status of job 
+        # return status of job with special code to signify the job is still being processed
+        return Response(content=job.json(), media_type='application/json', status_code=status.HTTP_202_ACCEPTED)
             
 
 #### SEARCH ####
-@app.get('/search')
-async def search(inp:SearchQueryInput = Depends()) -> List[Dict]:
+# NOTE: all scripts are returned as ready JSON bytes (Response), search results are validated by response_model
+@app.get('/search', response_model=List[Dict])
+async def search(inp:SearchQueryInput = Depends(), library:CadLibrary = Depends(get_library)) -> Response | List[Dict]:
     if inp.q is None: # return all scripts
-        return [s.dict() for s in library.scripts]
+        return Response(content=library.get_all_scripts_json(), media_type='application/json')
     else:
-        return library.search(inp.q)
+        return await run_in_threadpool(library.search, inp.q)
 
-@app.post('/search')
-async def search(inp:SearchQueryInput) -> List[Dict]:
+@app.post('/search', response_model=List[Dict])
+async def search(inp:SearchQueryInput, library:CadLibrary = Depends(get_library)) -> Response | List[Dict]:
     if inp.q is None: # return all scripts
-        return [s.dict() for s in library.scripts]
+        return Response(content=library.get_all_scripts_json(), media_type='application/json')
     else:
-        return library.search(inp.q)
+        return await run_in_threadpool(library.search, inp.q)
 
 
 #### TEST SERVER ####
 if __name__ == '__main__':
-    uvicorn.run(app, host='127.0.0.1', port=8090, workers=1)
+    # NOTE: no uvloop (uvicorn[standard] installs it and picks it by default): nest_asyncio (see ModelRequestHandler) can only patch the default asyncio loop
+    uvicorn.run('main:app', host='127.0.0.1', port=8090, workers=int(os.environ.get('WEB_CONCURRENCY', 1)), http='httptools', loop='asyncio')
 
@@ -4,12 +4,22 @@
 
 '''
 
-from typing import List, Any
+from typing import List, Any, Dict, Tuple
 from enum import Enum
-
-from fastapi import FastAPI, Depends
+from functools import lru_cache
+
+from fastapi import FastAPI, APIRouter, Depends
+from fastapi.openapi.utils import get_openapi
+from starlette.routing import BaseRoute, Match, NoMatchFound
+from starlette.types import Scope, Receive, Send
+try:
+    from starlette._utils import get_route_path # path without root_path: what newer Starlette routes match on
+except ImportError:
+    def get_route_path(scope:Scope) -> str:
+        return scope['path'] # older Starlette routes match on the full path
 from pydantic import create_model, conint, constr
 import logging
+import orjson
 
 from .CadScript import CadScript
 from .CadLibrary import CadLibrary
@@ -20,100 +30,251 @@ from .models import ModelRequestInput
 
 from .settings import params as PARAM_SETTINGS
 
+PARAM_TYPE_TO_PYTHON_TYPE = {
+    'number' : float,
+    'text' : str,
+    'options' : str,
+    'boolean' : bool,
+}
+
+PARAM_TYPE_TO_PYDANTIC_MODEL = {
+    'number' : ParamConfigNumber,
+    'text' : ParamConfigText,
+    'boolean' : ParamConfigBoolean,
+    'options' : ParamConfigOptions,
+}
+
+#### PARAM FIELD TYPES ####
+# NOTE: creating constrained types and enums is expensive: cache them by definition
+
+@lru_cache(maxsize=None)
+def _make_conint(start:int|float, end:int|float, step:int|float):
+    return conint(ge=start, le=end, multiple_of=step)
+
+@lru_cache(maxsize=None)
+def _make_constr():
+    return constr(strip_whitespace=True, 
+                    strict=True, 
+                    min_length=PARAM_SETTINGS['PARAM_INPUT_TEXT_MINLENGTH'], 
+                    max_length=PARAM_SETTINGS['PARAM_INPUT_TEXT_MAXLENGTH'])
+
+@lru_cache(maxsize=None)
+def _make_options_enum(options:Tuple[str]):
+    # create dynamic enum
+    enum_kv = zip(options, options)
+    class TempEnum(str, Enum):
+        pass
+    TypeEnum = TempEnum("TypeEnum", enum_kv)
+
+    return TypeEnum
+
+class ScriptEndpointsRoute(BaseRoute):
+    """
+        A single route on the API for the endpoints of all scripts
+        The path '/{org}/{name}/...' is matched to the router of that script with a dict lookup 
+        instead of testing every route of every script in turn
+    """
+
+    def __init__(self, api_generator:'ApiGenerator'):
+
+        self.api_generator = api_generator
+
+    def matches(self, scope:Scope) -> Tuple[Match, Scope]:
+
+        if scope['type'] != 'http':
+            return Match.NONE, {}
+
+        path_parts = get_route_path(scope).split('/', 3) # [ '', org, name, rest ]. Same path as the routes of the script match on
+        if len(path_parts) < 3:
+            return Match.NONE, {}
+        
+        router = self.api_generator.get_script_router(path_parts[1], path_parts[2])
+        if router is None:
+            return Match.NONE, {}
+
+        partial = None
+        for route in router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return Match.FULL, { **child_scope, 'occi_script_route': route }
+            elif match == Match.PARTIAL and partial is None:
+                partial = { **child_scope, 'occi_script_route': route }
+
+        if partial is not None:
+            return Match.PARTIAL, partial # wrong method
+
+        return Match.NONE, {}
+
+    async def handle(self, scope:Scope, receive:Receive, send:Send):
+
+        await scope['occi_script_route'].handle(scope, receive, send)
+
+    def url_path_for(self, name:str, **path_params:Any):
+
+        for router in self.api_generator.script_routers.values():
+            if router is None: # endpoints could not be generated
+                continue
+            try:
+                return router.url_path_for(name, **path_params)
+            except NoMatchFound:
+                pass
+        
+        raise NoMatchFound(name, path_params)
+
+
 class ApiGenerator:
 
-    library = None
-    request_handler:ModelRequestHandler = None
-    script:List[CadScript] = []
-    api = None
-    api_tags = [] # open API tags
+    # NOTE: all state is per instance (see __init__), slots keep it from being set anywhere else
+    __slots__ = ('library', 'request_handler', 'scripts', 'api', 'api_tags', 'scripts_by_namespace', 'script_routers', 'input_models', 'logger')
+
+    library:CadLibrary
+    request_handler:ModelRequestHandler
+    scripts:List[CadScript]
+    api:FastAPI
+    api_tags:List[dict] # open API tags, one per script name
+    scripts_by_namespace:Dict[Tuple[str,str],CadScript] # (org, name): script that gets endpoints
+    script_routers:Dict[Tuple[str,str],APIRouter|None] # (org, name): router with endpoints of script. Generated on first use. None if that failed
+    input_models:Dict[Tuple,type] # params signature: endpoint input model. Shared by scripts with the same params
+    logger:logging.Logger
     
 
     def __init__(self, library:CadLibrary):
 
+        self.logger = logging.getLogger(__name__) # handlers are configured by the app (see main.py)
         self.library = library
+        self.request_handler = None
+        self.scripts = []
+        self.api = None
+        self.api_tags = []
+        self.scripts_by_namespace = {}
+        self.script_routers = {}
+        self.input_models = {}
 
         if isinstance(self.library, CadLibrary):
             self.request_handler = ModelRequestHandler(self.library)
         else:
-            self.error('ApiGenerator::__init__(library): Please supply a library instance to this ApiGenerator')
+            self.logger.error('ApiGenerator::__init__(library): Please supply a library instance to this ApiGenerator')
 
 
-    def get_api_tags(self, scripts:List[CadScript]):
+    def get_api_tags(self, scripts:List[CadScript]) -> List[dict]:
         
-        # generate endpoints per script model
+        # rebuild: calling this again does not add duplicates
+        self.api_tags = []
+        tag_names = set() # with multiple versions of a script the first one gets the tag
+
         if scripts:
             for script in scripts:
-                self._add_api_tags(script)
+                if script.name not in tag_names:
+                    tag_names.add(script.name)
+                    self._add_api_tags(script)
         
         return self.api_tags
 
 
     def generate_endpoints(self, api:FastAPI, scripts:List[CadScript]):
+        """
+            Add the endpoints of all scripts to the API
+            The endpoints of a script are only generated when the script is first requested (or the API docs are)
+            A single ScriptEndpointsRoute on the API finds them for a request
+        """
 
         self.api = api
         self.scripts = scripts
 
-        # generate endpoints per script model
-
         if scripts:
             for script in scripts:
-                self._generate_endpoint(script)
+                # NOTE: with multiple versions the first script gets the endpoints
+                self.scripts_by_namespace.setdefault((script.org, script.name), script)
+
+        api.router.routes.append(ScriptEndpointsRoute(self))
+
+        # the OpenAPI docs need the endpoints of all scripts
+        def openapi():
+            if not api.openapi_schema:
+                script_routers = [self.get_script_router(org, name) for org,name in self.scripts_by_namespace]
+                script_routes = [route for router in script_routers if router is not None for route in router.routes] # skip scripts without endpoints
+                api.openapi_schema = get_openapi(title=api.title, version=api.version, openapi_version=api.openapi_version,
+                                                description=api.description, routes=api.routes + script_routes, 
+                                                tags=api.openapi_tags, servers=api.servers)
+            return api.openapi_schema
+        
+        api.openapi = openapi
+
+    def get_script_router(self, org:str, name:str) -> APIRouter:
+        """
+            Get router with endpoints of script with given org and name 
+            Generate the endpoints if it's the first time
+            NOTE: this runs while matching requests: a script with a bad config gets no endpoints (None)
+            instead of breaking every request and the API docs
+        """
+
+        if (org, name) in self.script_routers:
+            return self.script_routers[(org, name)]
+
+        script = self.scripts_by_namespace.get((org, name))
+        if script is None:
+            return None
+
+        try:
+            router = self._generate_endpoint(script)
+        except Exception as e:
+            self.logger.error(f'ApiGenerator::get_script_router(): Could not generate endpoints for script "{org}/{name}": {e}. Skipped!')
+            router = None
+        self.script_routers[(org, name)] = router
+        
+        return router
 
 
-    def _generate_endpoint(self,script:dict):
+    def _generate_endpoint(self,script:dict) -> APIRouter:
 
-        api = self.api
+        # same settings as routes added to the API directly. All endpoints of the script share its namespace as prefix
+        api = APIRouter(prefix=f'/{script.org}/{script.name}', tags=[script.name], 
+                        default_response_class=self.api.router.default_response_class, dependency_overrides_provider=self.api)
 
         # we generate specific input models that handle param names: bracket?width=10
         SpecificEndpointInputModel = self._generate_endpoint_input_model(script)
         
-        # GET
-        @api.get(f'/{script.org}/{script.name}', tags=[script.name])
-        async def get_model_get(req:SpecificEndpointInputModel=Depends()): # see: https://github.com/tiangolo/fastapi/issues/318
-            req.script_org = script.org
-            req.script_name = script.name # this is important to identify the requested script
-            return await self.request_handler.handle(req)
-
-        @api.get(f'/{script.org}/{script.name}/versions', tags=[script.name]) # IMPORTANT: this route needs to be before '/{script.name}/{{version}}'
-        async def get_model_get_versions(req:SpecificEndpointInputModel=Depends()): # see: https://github.com/tiangolo/fastapi/issues/318
-            req.script_org = script.org
-            req.script_name = script.name
-            req.script_special_requested_entity = 'versions'
-            return await self.request_handler.handle(req)
-
-        @api.get(f'/{script.org}/{script.name}/{{version}}', tags=[script.name])
-        async def get_model_get_version(version:str, req:SpecificEndpointInputModel=Depends()): # see: https://github.com/tiangolo/fastapi/issues/318
-            req.script_org = script.org
-            req.script_name = script.name
-            req.script_version = version
-            return await self.request_handler.handle(req)
-
-    
-        @api.get(f'/{script.org}/{script.name}/{{version}}/params', tags=[script.name])
-        async def get_model_get_params(version:str, req:SpecificEndpointInputModel=Depends()): # see: https://github.com/tiangolo/fastapi/issues/318
-            req.script_org = script.org
-            req.script_name = script.name
-            req.script_version = version
-            req.script_special_requested_entity = 'params'
-            return await self.request_handler.handle(req)
-
-        @api.get(f'/{script.org}/{script.name}/{{version}}/presets', tags=[script.name])
-        async def get_model_get_presets(version:str, req:SpecificEndpointInputModel=Depends()): # see: https://github.com/tiangolo/fastapi/issues/318
-            req.script_org = script.org
-            req.script_name = script.name
-            req.script_version = version
-            req.script_special_requested_entity = 'presets'
-            return await self.request_handler.handle(req)
+        # GET endpoints: (path after prefix, name, with version in path, special requested entity)
+        ENDPOINTS = [
+            ('', 'get_model_get', False, None),
+            ('/versions', 'get_model_get_versions', False, 'versions'), # IMPORTANT: this route needs to be before '/{version}'
+            ('/{version}', 'get_model_get_version', True, None),
+            ('/{version}/params', 'get_model_get_params', True, 'params'),
+            ('/{version}/presets', 'get_model_get_presets', True, 'presets'),
+        ]
+
+        for path, name, with_version, special_requested_entity in ENDPOINTS:
+            endpoint = self._make_endpoint_handler(script.org, script.name, SpecificEndpointInputModel, with_version, special_requested_entity)
+            api.add_api_route(path, endpoint, methods=['GET'], name=name)
 
         # NOTE: Don't add copies of the above endpoints in POST for now. For clarity
-        '''
-        @api.post(f'/{script.name}', tags=[script.name])
-        async def get_model_post(req:SpecificEndpointInputModel): # NOTE: POST needs no Depends()
-            req.script_name = script.name # this is important to identify the requested script
-            return await self.request_handler.handle(req)
-        '''
-            
+        # (a POST handler needs the input model as body: req:SpecificEndpointInputModel without Depends())
+
+        return api
+
+    def _make_endpoint_handler(self, script_org:str, script_name:str, SpecificEndpointInputModel:type, with_version:bool, special_requested_entity:str=None):
+        """
+            Make a handler for a script endpoint that fills in the request and hands it to the request handler
+            All handlers share the code of the two functions below, only the values they are bound to differ
+        """
+
+        handle = self.request_handler.handle
+
+        if with_version:
+            async def endpoint_handler(version:str, req:SpecificEndpointInputModel=Depends()): # see: https://github.com/tiangolo/fastapi/issues/318
+                req.script_org = script_org
+                req.script_name = script_name # this is important to identify the requested script
+                req.script_version = version
+                req.script_special_requested_entity = special_requested_entity
+                return await handle(req)
+        else:
+            async def endpoint_handler(req:SpecificEndpointInputModel=Depends()): # see: https://github.com/tiangolo/fastapi/issues/318
+                req.script_org = script_org
+                req.script_name = script_name # this is important to identify the requested script
+                req.script_special_requested_entity = special_requested_entity
+                return await handle(req)
+        
+        return endpoint_handler
 
 
     def _parse_script_dict(self, script:dict) -> CadScript:
@@ -130,32 +291,41 @@ class ApiGenerator:
         """
 
         BASE_EXEC_REQUEST = ModelRequestInput # this is the basic model for a Script exec request
-        PARAM_TYPE_TO_PYTHON_TYPE = {
-            'number' : float,
-            'text' : str,
-            'options' : str,
-            'boolean' : bool,
-        }
-        
-        fields = {} # dynamic pydantic field definitions
 
+        # creating a Pydantic model is expensive: reuse the one of a script with the same params
+        params_signature = self._get_params_signature(script)
+        EndpointInputModel = self.input_models.get(params_signature)
+        if EndpointInputModel is not None:
+            return EndpointInputModel
+        
         for param in script.params.values():
-            
-            field_type = PARAM_TYPE_TO_PYTHON_TYPE.get(param.type)
+            if param.type not in PARAM_TYPE_TO_PYTHON_TYPE:
+                raise Exception(f'ApiGenerator::_generate_endpoint_input_model(): Unknown type "{param.type}" of param "{param.name}" in script "{script.name}"')
 
-            if field_type:
-                field_def = self._param_to_field_def(param)
-                fields[param.name] = (field_def, self._get_param_default(param) ) # here we plug the default value too
+        # dynamic pydantic field definitions: here we plug the default value too
+        fields = { param.name: (self._param_to_field_def(param), self._get_param_default(param)) for param in script.params.values() }
 
         # now make the Pydantic Input model definition
+        # NOTE: the model is only used to generate query parameters (Depends()), so its name is not in the API docs
         EndpointInputModel = create_model(
             f'{script.name}Inputs', # for example BracketInputs
             **fields,
             __base__ = BASE_EXEC_REQUEST,
         )
+        self.input_models[params_signature] = EndpointInputModel
 
         return EndpointInputModel
     
+    def _get_params_signature(self, script:CadScript) -> Tuple:
+        """
+            Everything of the params of a script that ends up in its endpoint input model
+            NOTE: the default comes from the config and can be anything (like a list): use it as JSON so the signature is hashable
+        """
+        return tuple(
+            (param.name, param.type, getattr(param, 'start', None), getattr(param, 'end', None), getattr(param, 'step', None), 
+                tuple(getattr(param, 'options', None) or ()), orjson.dumps(self._get_param_default(param), option=orjson.OPT_SORT_KEYS))
+            for param in script.params.values())
+
     def _get_param_default(self,param:ParamConfigBase) -> Any:
         """
             Get default value (if not given) for a specific type of param
@@ -180,13 +350,6 @@ class ApiGenerator:
 
         # NOTE: There is almost the same method in CadLibrary class - TODO: move method into utils
 
-        PARAM_TYPE_TO_PYDANTIC_MODEL = {
-            'number' : ParamConfigNumber,
-            'text' : ParamConfigText,
-            'boolean' : ParamConfigBoolean,
-            'options' : ParamConfigOptions,
-        }
-
         if param:
             PydanticModel = PARAM_TYPE_TO_PYDANTIC_MODEL.get(param.type)
             if PydanticModel:
@@ -199,48 +362,22 @@ class ApiGenerator:
         """
             Convert Param to Pydantic Field Type for dynamic parameters
             See: https://docs.pydantic.dev/usage/types
+            Params with the same definition (also in other scripts) get the same type
         """
         if param.type == 'number':
-            return conint(ge=param.start, le=param.end, multiple_of=param.step)
+            return _make_conint(param.start, param.end, param.step)
         elif param.type == 'text':
-            return constr(strip_whitespace=True, 
-                            strict=True, 
-                            min_length=PARAM_SETTINGS['PARAM_INPUT_TEXT_MINLENGTH'], 
-                            max_length=PARAM_SETTINGS['PARAM_INPUT_TEXT_MAXLENGTH'])
+            return _make_constr()
         elif param.type == 'boolean':
             return bool
         elif param.type == 'options':
-            # create dynamic enum
-            enum_kv = zip(param.options, param.options)
-            class TempEnum(str, Enum):
-                pass
-            TypeEnum = TempEnum("TypeEnum", enum_kv)
-
-            return TypeEnum
+            return _make_options_enum(tuple(param.options))
         
 
     def _add_api_tags(self, script:dict):
 
         self.api_tags.append({ 'name': script.name, **script.meta })
 
-    def _setup_logger(self):
-
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(level=logging.INFO)
-
-        try:
-            handler = logging.StreamHandler()
-            handler.setLevel(logging.INFO)
-            formatter = logging.Formatter('%(asctime)s %(name)s %(levelname)-4s %(message)s')
-            handler.setFormatter(formatter)
-
-            if (self.logger.hasHandlers()):  # see: http://tiny.cc/v5w6gz
-                self.logger.handlers.clear()
-
-            self.logger.addHandler(handler)
-
-        except Exception as e:
-            self.logger.error(e)
 
     
 
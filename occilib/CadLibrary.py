@@ -15,23 +15,24 @@
 import os
 import __main__
 import logging
-from glob import iglob
 from pathlib import Path
 from shutil import rmtree
-import re
 from datetime import datetime
-import json
+import orjson
 import base64
-import asyncio
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import uuid
+from collections import OrderedDict
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 
 from fastapi.responses import Response, FileResponse
+from celery import group
+from celery.result import GroupResult
 from semver.version import Version
 
-from .CadScript import ModelRequest, CadScript, CadScriptRequest, CadScriptResult, ModelComputeJob
+from .CadScript import ModelRequest, CadScript, CadScriptRequest, CadScriptResult, ModelComputeJob, HASH_VERSION
 from .CadLibrarySearch import CadLibrarySearch
 from .Param import ParamConfigNumber, ParamConfigText, ParamConfigOptions, ParamConfigBoolean
 
@@ -42,32 +43,63 @@ class CadLibrary:
 
     DEFAULT_PATH = './scriptlibrary' # relative to script
     FILE_STRUCTURE_TEMPLATE = '{org}/{name}/{version}/{script}' # IMPORTANT: linux directory seperator '/' (not '\')
+    FILE_STRUCTURE_TEMPLATE_TERMS = tuple(term.strip('{}') for term in FILE_STRUCTURE_TEMPLATE.split('/')) # ('org', 'name', 'version', 'script')
     CADSCRIPT_FILE_GLOB = ['*.py', '*.js']
     CADSCRIPT_CONFIG_GLOB = ['*.json', '*.yaml'] # TODO: YAML
     COMPUTE_FILE_EXT = '.compute'
+    CACHE_HASH_VERSION_FILE = '.hash-version' # in cache directory of script: version of the hashes of its cached variants
+    SCRIPT_INDEX_FILE = '.occi-index.json' # index of parsed scripts in library directory for fast startup
+    SCRIPT_INDEX_FORMAT = 2 # raise when the content of the script index changes
+    CACHED_SCRIPT_DICTS_MAX_SIZE = 32 * 1024 * 1024 # total size (of result.json files) of cached results kept in memory for full responses. Per API worker
+    CACHED_SCRIPT_DICT_MAX_SIZE = 1024 * 1024 # bigger results are read from disk every time
 
     request_handler = None # set when precomputing cache
     searcher:CadLibrarySearch = None 
     source = 'disk' # source of the scripts: disk or file (debug)
     rel_path = DEFAULT_PATH # relative path to directory of CadScripts
     path = None # absolute path to directory of CadScripts
-    scripts:List[CadScript] = [] # all scripts
+    scripts:List[CadScript] # all scripts (in order of loading)
 
-    latest_scripts:Dict[str,CadScript] = {} # only the latest scripts by unique namespace ({org}/{name})
-    script_versions:Dict[str,List[CadScript]] = {} # by unique namespace ({org}/{name})
+    scripts_by_id:Dict[str,CadScript] # all scripts by unique id ({org}/{name}/{version}). Filled while loading
+    latest_scripts:Dict[str,CadScript] # only the latest scripts by unique namespace ({org}/{name})
+    script_versions:Dict[str,List[CadScript]] # by unique namespace ({org}/{name})
     
-    dirs_by_script_name:Dict[str,str] = {}
+    dirs_by_script_name:Dict[str,str]
+    _script_cache_dirs:Dict[str,str] # cache directory by script name. Reset when scripts are (re)loaded
+    _script_file_stats:Dict[str,os.stat_result] # stats of files in script directories by path from library. Only while loading
+    _script_dir_files:Dict[str,List[str]] # names of files in script directories by path from library. Only while loading
 
-    _compute_batch_counters = {} # { uuid1: 13, uuid2: 12 } 
-    _compute_batch_totals = {} # total number of tasks in batch { uuid1: 200 } 
+    _cached_script_files:Dict[str,str] # result.json paths known to be in cache by '{script name}/{hash}'
+    _cached_script_dicts:OrderedDict[str,Dict[str,Tuple[Tuple[int,int],dict,int]]] # (result.json mtime and size, parsed result.json, size) by '{script name}/{hash}' and requested format. Least recently used first
+    _cached_script_dicts_size:int = 0 # total size of the results in _cached_script_dicts
+    _all_scripts_json:bytes = None # serialized list of all scripts. Reset when scripts are (re)loaded
+    _script_entities_json:Dict[str,bytes] # serialized versions, params and presets by '{script id}/{entity}'. Reset when scripts are (re)loaded
+
+    _compute_batch_counters:Dict[str,int] # { uuid1: 13, uuid2: 12 } 
+    _compute_batch_totals:Dict[str,int] # total number of tasks in batch { uuid1: 200 } 
 
     def __init__(self, rel_path:str=DEFAULT_PATH):
         """
             Populate a library with CadScripts either from a directory (default) or a json file (for debugging)
             Paths are relative to root of the api directory
         """
-        self._setup_logger()
+        self.logger = logging.getLogger(__name__) # handlers are configured by the app (see main.py)
         self.path = Path(rel_path).resolve()
+        # NOTE: all state is per library instance: never share these dicts and lists between libraries
+        self.scripts = []
+        self.scripts_by_id = {}
+        self.latest_scripts = {}
+        self.script_versions = {}
+        self.dirs_by_script_name = {}
+        self._script_cache_dirs = {}
+        self._script_file_stats = {}
+        self._script_dir_files = {}
+        self._cached_script_files = {}
+        self._cached_script_dicts = OrderedDict()
+        self._cached_script_dicts_size = 0
+        self._script_entities_json = {}
+        self._compute_batch_counters = {}
+        self._compute_batch_totals = {}
 
         if '.json' in rel_path:
             self._load_scripts_json(rel_path)
@@ -79,7 +111,10 @@ class CadLibrary:
                 self._load_scripts_dir(self.path)        
         
         self.order_scripts()
-        self._clear_computing_files() # clear all compute files in cache to avoid old stuff blocking new tasks
+        # clear all compute files in cache to avoid old stuff blocking new tasks
+        # NOTE: this runs in every API worker (WEB_CONCURRENCY). A restarted worker also clears the markers of jobs
+        # that are still computing for the other workers: at worst the same variant is computed again
+        self._clear_computing_files()
         self.searcher = CadLibrarySearch(library=self) # initiate search index
 
         self._print_library_overview()
@@ -88,24 +123,24 @@ class CadLibrary:
 
     def order_scripts(self):
         '''
-            We have all scripts in self.scripts. Order them for easy access.
+            We have all scripts in self.scripts (and by id in self.scripts_by_id). Order them for easy access.
+            Scripts are grouped in one pass so lookups by namespace are O(1) afterwards
         '''
         
+        scripts_by_namespace:Dict[str,List[CadScript]] = {}
         for script in self.scripts:
-            scripts_by_namespace = list(filter(lambda s: s.name == script.name, self.scripts))
-            if len(scripts_by_namespace) == 1:
-                self.latest_scripts[script.namespace] = script
-                self.script_versions[script.namespace] = [script.version]
-            else:
-                if not self.latest_scripts.get(script.name):
-                    scripts_by_namespace_sorted = sorted(scripts_by_namespace, key=lambda s: s.version)
-                    self.latest_scripts[script.namespace] = scripts_by_namespace_sorted[-1] # pick last one ordered by semver
-                    self.script_versions[script.namespace] = [s.version for s in scripts_by_namespace_sorted]
+            scripts_by_namespace.setdefault(script.namespace, []).append(script)
 
+        for namespace, namespace_scripts in scripts_by_namespace.items():
+            namespace_scripts_sorted = sorted(namespace_scripts, key=lambda s: s.version)
+            self.latest_scripts[namespace] = namespace_scripts_sorted[-1] # pick last one ordered by version
+            self.script_versions[namespace] = [s.version for s in namespace_scripts_sorted]
 
-    def get_script_request(self, org:str, name:str, version:str=None) -> CadScriptRequest:
+
+    def get_script(self, org:str, name:str, version:str=None) -> CadScript:
         '''
-            Get script with given name 
+            Get script with given name (and version, otherwise the latest)
+            NOTE: This is the script instance of the library itself, don't change it. Use get_script_request() for that
         '''
         
         # check if user might use a float
@@ -116,22 +151,73 @@ class CadLibrary:
         if version is None:
             script = self.latest_scripts.get(f'{org}/{name}') # namespace
         else:
-            l = list(filter(lambda s: (s.org == org and s.name == name and s.version == version), self.scripts))
-            if l:
-                script = l[0]
+            script = self.scripts_by_id.get(f'{org}/{name}/{version}') # id
 
         if not script:
-            self.logger.error(f'CadLibrary:get_script_request(org, name, version): Could not find script with org "{org}", name "{name}" and version "{version}" [optional] in library!')
+            self.logger.error(f'CadLibrary:get_script(org, name, version): Could not find script with org "{org}", name "{name}" and version "{version}" [optional] in library!')
             return None
+
+        return script
+
+    def get_script_request(self, org:str, name:str, version:str=None) -> CadScriptRequest:
+        '''
+            Get script with given name 
+        '''
         
-        script_request = CadScriptRequest(**dict(script)) # upgrade CadScript instance to CadScriptRequest for direct use by ModelRequestHandler
-        script_request.request.created_at = datetime.now() # we need to refresh created_at (the original request ismade when the script is loaded)
+        script = self.get_script(org, name, version)
+        if not script:
+            return None
+        
+        # upgrade CadScript instance to CadScriptRequest for direct use by ModelRequestHandler
+        # NOTE: the library script is already validated: construct() skips validation and gives a new empty request
+        # construct() does not copy: give the request its own containers so changing them never changes the library
+        script_request = CadScriptRequest.construct(**(dict(script) | {
+            'params' : { param_name: param.copy() for param_name, param in script.params.items() },
+            'param_presets' : { preset_name: dict(preset) for preset_name, preset in script.param_presets.items() },
+            'meta' : dict(script.meta),
+            'script_cad_engine_config' : dict(script.script_cad_engine_config) if script.script_cad_engine_config is not None else None,
+        }))
 
         return script_request
 
-    def get_script_versions(self, name:str) -> List[str]:
+    def get_all_scripts_json(self) -> bytes:
+        '''
+            Get all scripts as JSON bytes 
+            Scripts only change when loaded, so we serialize once and serve the same bytes after that
+        '''
+        if self._all_scripts_json is None:
+            self._all_scripts_json = orjson.dumps([s.dict() for s in self.scripts])
+
+        return self._all_scripts_json
+
+    def get_script_versions(self, namespace:str) -> List[str]:
 
-        return self.script_versions.get(name)
+        return self.script_versions.get(namespace)
+
+    def get_script_entity_json(self, script:CadScript, entity:str) -> bytes:
+        '''
+            Get the versions, params or presets of a script as JSON bytes
+            Like all scripts, these only change when scripts are loaded
+        '''
+
+        entity_key = f'{script.id}/{entity}'
+        entity_json = self._script_entities_json.get(entity_key)
+
+        if entity_json is None:
+            if entity == 'versions':
+                entity_content = self.get_script_versions(namespace=script.namespace)
+            elif entity == 'params':
+                entity_content = { name: param.dict() for name,param in script.params.items() }
+            elif entity == 'presets':
+                entity_content = script.param_presets
+            else:
+                self.logger.error(f'CadLibrary::get_script_entity_json(script, entity): Unknown entity "{entity}"')
+                return None
+            
+            entity_json = orjson.dumps(entity_content)
+            self._script_entities_json[entity_key] = entity_json
+
+        return entity_json
 
 
     def _load_scripts_json(self, rel_path:str) -> List[CadScriptRequest]:
@@ -147,7 +233,7 @@ class CadLibrary:
 
         # just parse the json
         try:
-            script_config_dicts = json.load(open(json_file_path))
+            script_config_dicts = self._read_json_file(json_file_path)
         except Exception as e:
             self.logger.error(f'CadLibrary::_load_scripts_json(): Failed to parse JSON config file "{json_file_path}" for CadScripts: "{e}"')
             return
@@ -156,58 +242,167 @@ class CadLibrary:
             self._set_params_keys_to_names(script_config) 
             base_script = CadScript(**script_config)
             base_script = self._upgrade_params(base_script, script_config)
-            self.scripts.append(base_script)
+            self._add_script(base_script)
 
+        self._all_scripts_json = None
+        self._script_entities_json = {}
+        self._script_cache_dirs = {}
         self.source = 'file' # set flag so we now the scripts came from a file
 
         return self.scripts
 
         
-    def _load_scripts_dir(self, path:str = None) -> List[CadScript]:
+    def _add_script(self, script:CadScript):
+        '''
+            Add a loaded script to the library: in order and by id directly
+        '''
+        self.scripts.append(script)
+        self.scripts_by_id[script.id] = script
 
-        library_path = Path(path or self.path)
+    def _load_scripts_dir(self, path:str = None) -> List[CadScript]:
 
-        for script_glob in self._template_to_script_globs(self.FILE_STRUCTURE_TEMPLATE):
-            for script_path in library_path.glob(script_glob):
-                script_path_from_lib = str(script_path.relative_to(self.path))
-                library_script = self._script_path_to_script(script_path_from_lib)
-                if library_script:
-                    self.scripts.append(library_script)
+        library_path = str(path or self.path)
+        script_paths = list(self._iter_script_paths(library_path))
+        index_fingerprint = self._get_script_index_fingerprint(library_path, script_paths)
+
+        # only parse all scripts and configs if the library changed since the last index was saved
+        if self._load_script_index(library_path, index_fingerprint) is False:
+            # parsing is mostly file IO (configs, code, stat) and independent per script: do it in threads
+            # NOTE: map keeps the order of the script paths. The only shared state set is a dict key per script (dirs_by_script_name)
+            with ThreadPoolExecutor() as executor:
+                for library_script in executor.map(self._script_path_to_script, script_paths):
+                    if library_script:
+                        self._add_script(library_script)
+            self._save_script_index(library_path, index_fingerprint)
         
+        self._script_file_stats = {} # only valid while loading
+        self._script_dir_files = {}
+        self._all_scripts_json = None
+        self._script_entities_json = {}
+        self._script_cache_dirs = {}
         self.source = 'disk'
         return self.scripts
 
-    def _template_to_script_globs(self, template) -> List[str]:
+    def _iter_script_paths(self, dir_path:str, rel_dir_path:str=None) -> Iterator[str]:
         '''
-            Convert script location template to glob
-            for example: '{namespace}/{name}/{version}/{script}' ==> [ '**/**/**/*.py', '**/**/**/*.js' ] 
-            see: self.FILE_STRUCTURE_TEMPLATE and self.CADSCRIPT_FILE_GLOB
+            Walk the library directory with os.scandir and yield paths of script files (relative to library)
+            Scripts are only found at the depth of self.FILE_STRUCTURE_TEMPLATE 
+            so we don't descend any deeper (for example into the cache directories)
+            Hidden directories (like .git) and __pycache__ are skipped
+            NOTE: symlinked directories are not followed, like in _clear_computing_files(): 
+            otherwise compute files of scripts in them would never be cleared
         '''
 
-        base_glob = re.sub('\{[^\}]+\}\/', '**/', template)
-        script_globs = []
-        for script_glob in self.CADSCRIPT_FILE_GLOB:
-            script_globs.append(base_glob.format(script=script_glob))
-        
-        return script_globs
+        script_depth = len(self.FILE_STRUCTURE_TEMPLATE_TERMS)
+        script_exts = tuple(script_glob.replace('*', '') for script_glob in self.CADSCRIPT_FILE_GLOB) # '*.py' ==> '.py'
+        depth = 1 if rel_dir_path is None else rel_dir_path.count('/') + 2
+
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                entry_rel_path = entry.name if rel_dir_path is None else f'{rel_dir_path}/{entry.name}'
+                if depth < script_depth:
+                    if not entry.name.startswith(('.', '__pycache__')) and entry.is_dir(follow_symlinks=False):
+                        yield from self._iter_script_paths(entry.path, entry_rel_path)
+                elif entry.name.endswith(script_exts) and entry.is_file():
+                    yield entry_rel_path
 
 
-    def _template_to_regex(self,template:str) -> str:
+    def _get_script_index_fingerprint(self, library_path:str, script_paths:List[str]) -> dict:
         '''
-            Convert a template string to a regex with named groups
-             for example: '{namespace}/{name}/{version}/{script}' 
-             ==> '(?P<namespace>[^/]+)/(?P<name>[^/]+)/(?P<version>[^/])/(?P<script>[^$]+)
+            Get the state of the library on disk to check if the saved script index is still valid
+            We use the script paths, the names of the files in the script directories and their newest modification time
+            NOTE: the names are needed too: removing or renaming (mv keeps the mtime) a file does not change the newest mtime
+            The stats and names of the files are kept while loading, so parsing the scripts does not stat or list them again
         '''
-        term_regexs = []
-        
-        for term in template.split('/'): # only linux
-            term_name = term.replace('{', '').replace('}', '')
-            term_regex = f'(?P<{term_name}>[^\{os.sep}]+)' if term_name != 'script' else '(?P<script>[^$]+)'
-            term_regexs.append(term_regex)
-            
-        return f'\{os.sep}'.join(term_regexs)
-        
 
+        newest_mtime = 0
+        for script_dir in set(os.path.dirname(script_path) for script_path in script_paths):
+            with os.scandir(os.path.join(library_path, script_dir)) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        entry_stat = entry.stat()
+                        newest_mtime = max(newest_mtime, entry_stat.st_mtime)
+                        self._script_file_stats[f'{script_dir}/{entry.name}'] = entry_stat
+                        self._script_dir_files.setdefault(script_dir, []).append(entry.name)
+
+        return { 
+            'index_format' : self.SCRIPT_INDEX_FORMAT, # don't load indexes saved by older code
+            'script_paths' : sorted(script_paths), 
+            'script_dir_files' : { script_dir: sorted(file_names) for script_dir, file_names in self._script_dir_files.items() },
+            'newest_mtime' : newest_mtime, 
+            'api_root_url' : CONFIG.get('API_ROOT_URL') if CONFIG else None # used in script.url
+        }
+
+    def _load_script_index(self, library_path:str, fingerprint:dict) -> bool:
+        '''
+            Load scripts from the index file in the library directory if it was made from the same library state
+        '''
+
+        index_path = os.path.join(library_path, self.SCRIPT_INDEX_FILE)
+
+        try:
+            with open(index_path, 'rb') as f:
+                index = orjson.loads(f.read())
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            self.logger.warn(f'CadLibrary::_load_script_index(): Could not read script index "{index_path}": {e}. Loading scripts from directory!')
+            return False
+
+        if index.get('fingerprint') != fingerprint:
+            self.logger.info('CadLibrary::_load_script_index(): Library changed since script index was saved. Loading scripts from directory!')
+            return False
+
+        # build everything first: an index with another shape (or edited by hand) should not load only some scripts
+        try:
+            index_scripts = []
+            for script_dict in index['scripts']:
+                base_script = CadScript(**script_dict)
+                index_scripts.append(self._upgrade_params(base_script, script_dict, validate=False)) # params were validated before saving the index
+            # script dirs are saved relative to the library: the same library can be mounted elsewhere (like in docker)
+            index_dirs_by_script_name = { script_name: os.path.join(self.path, script_dir) for script_name, script_dir in index['dirs_by_script_name'].items() }
+        except Exception as e:
+            self.logger.warn(f'CadLibrary::_load_script_index(): Invalid script index "{index_path}": {e}. Loading scripts from directory!')
+            return False
+
+        for index_script in index_scripts:
+            self._add_script(index_script)
+        self.dirs_by_script_name.update(index_dirs_by_script_name)
+
+        self.logger.info(f'CadLibrary::_load_script_index(): Loaded {len(index_scripts)} scripts from script index "{index_path}"')
+
+        return True
+
+    def _save_script_index(self, library_path:str, fingerprint:dict) -> bool:
+        '''
+            Save all parsed scripts in an index file in the library directory
+            The file is written under a temporary name and then moved, so other API workers never read a half written index
+        '''
+
+        index_path = os.path.join(library_path, self.SCRIPT_INDEX_FILE)
+        index = {
+            'fingerprint' : fingerprint,
+            'scripts' : [s.dict() for s in self.scripts],
+            'dirs_by_script_name' : { script_name: os.path.relpath(script_dir, self.path) for script_name, script_dir in self.dirs_by_script_name.items() },
+        }
+
+        tmp_index_path = None
+        try:
+            with tempfile.NamedTemporaryFile(mode='wb', dir=library_path, delete=False) as f:
+                tmp_index_path = f.name
+                f.write(orjson.dumps(index))
+            os.replace(tmp_index_path, index_path)
+        except Exception as e:
+            self.logger.warn(f'CadLibrary::_save_script_index(): Could not save script index "{index_path}": {e}')
+            # don't leave the temporary file in the library
+            if tmp_index_path is not None:
+                try:
+                    os.unlink(tmp_index_path)
+                except OSError:
+                    pass
+            return False
+
+        return True
 
     def _script_path_to_script(self,script_path:str) -> CadScript: 
 
@@ -216,14 +411,15 @@ class CadLibrary:
             TODO: rewrite this from template pattern and grouped regex for easy config!
         """
 
-        parse_script_path_regex = self._template_to_regex(self.FILE_STRUCTURE_TEMPLATE)
-        match = re.match(parse_script_path_regex, script_path)
+        # script paths come from a walk at the depth of the template: just split them into the template terms
+        # NOTE: the last term (script) gets the rest of the path
+        script_path_parts = script_path.split('/', len(self.FILE_STRUCTURE_TEMPLATE_TERMS) - 1) # only linux
 
-        if not match:
+        if len(script_path_parts) != len(self.FILE_STRUCTURE_TEMPLATE_TERMS) or '' in script_path_parts:
             self.logger.error(f'CadLibrary::_script_path_to_script(): Cannot parse script_path {script_path}. Please make sure you use the file structure "{self.FILE_STRUCTURE_TEMPLATE}" in library root "{self.path}"!')
             return None
         else:
-            script_path_values = match.groupdict()
+            script_path_values = dict(zip(self.FILE_STRUCTURE_TEMPLATE_TERMS, script_path_parts))
 
             if Version.isvalid(script_path_values['version']):
                 self.logger.error(f'CadLibrary::_script_path_to_script(): Script at path "{script_path}" has invalid semversion. Skipped! Please check!')
@@ -243,38 +439,52 @@ class CadLibrary:
                 # try getting extra info from path
                 base_script.code = self._get_code_from_script_path(script_path)
                 base_script.script_cad_language = self._get_code_cad_language(script_path)
-                base_script.created_at = self._get_script_created_at(script_path)
-                base_script.updated_at = self._get_script_updated_at(script_path)
+                base_script.created_at, base_script.updated_at = self._get_script_times(script_path)
 
         return base_script
 
 
-    def _get_script_created_at(self,script_path:str) -> datetime: # NOTE: path from library
-        script_abs_path = os.path.realpath(os.path.join(self.path, script_path))
-        return datetime.fromtimestamp(os.path.getctime(script_abs_path))
-
-    def _get_script_updated_at(self,script_path:str) -> datetime: # NOTE: path from library
-        script_abs_path = os.path.realpath(os.path.join(self.path, script_path))
-        return datetime.fromtimestamp(os.path.getmtime(script_abs_path))
+    def _get_script_times(self,script_path:str) -> Tuple[datetime,datetime]: # NOTE: path from library
+        '''
+            Get created_at and updated_at of script file with one stat call (or the one done while checking the script index)
+            NOTE: self.path is already resolved, stat follows any symlinks
+        '''
+        script_stat = self._script_file_stats.get(script_path) or os.stat(os.path.join(self.path, script_path))
+        return datetime.fromtimestamp(script_stat.st_ctime), datetime.fromtimestamp(script_stat.st_mtime)
 
     def _parse_config(self,script_path:str) -> CadScript:
         """
             Basic on script_path (relative to library dir) scan directory for a config file (*.json or *.yaml)
             If config found populate an CadScript instance, otherwise return
         """
-        script_dir_abs_path = os.path.dirname(os.path.realpath(os.path.join(self.path, script_path)))
+        script_dir_path = os.path.dirname(script_path)
+        script_dir_abs_path = os.path.join(self.path, script_dir_path) # NOTE: self.path is already resolved
         script_dir_name = os.path.split(script_dir_abs_path)[-1]
         script_path, script_ext = os.path.splitext(script_path)
         script_name_with_ext = os.path.split(script_path)[-1]
-        script_name = script_name_with_ext.split('.')[0]
+        script_name = script_name_with_ext.partition('.')[0]
         
+        # use the files listed while loading the library or list the script directory once
+        script_dir_files = self._script_dir_files.get(script_dir_path)
+        if script_dir_files is None:
+            with os.scandir(script_dir_abs_path) as entries:
+                script_dir_files = [entry.name for entry in entries if entry.is_file()]
+
+        # group the config files by extension ('*.json' ==> '.json')
+        config_exts = [config_glob.replace('*', '') for config_glob in self.CADSCRIPT_CONFIG_GLOB]
+        config_files_by_ext:Dict[str,List[str]] = {}
+        for file_name in script_dir_files:
+            file_ext = os.path.splitext(file_name)[1]
+            if file_ext in config_exts and not file_name.startswith('.'): # like glob: skip hidden files
+                config_files_by_ext.setdefault(file_ext, []).append(file_name)
+
         script_config_file = None
-        for config_ext in self.CADSCRIPT_CONFIG_GLOB:
-            script_config_file_paths = list(iglob(config_ext, root_dir=script_dir_abs_path))
+        for config_ext in config_exts: # in order of preference
+            script_config_file_paths = config_files_by_ext.get(config_ext, [])
             if len(script_config_file_paths) > 0:
                 script_config_file = script_config_file_paths[0]
                 if len(script_config_file_paths) > 1:
-                    script_config_file_paths_flat = script_config_file_paths.join(',')
+                    script_config_file_paths_flat = ','.join(script_config_file_paths)
                     self.logger.warn(f'CadLibrary::_parse_config(): There are multiple config files found ({script_config_file_paths_flat}) for script "{script_path}". Took the first!')
                 break
         
@@ -282,7 +492,7 @@ class CadLibrary:
             self.logger.warn(f'CadLibrary::_script_path_to_script(): No config found for component "{script_name}. Check its directory: "{script_path}"! Script is consided static now')
             return CadScript(name=script_name) # return default script (only name is required)
         else:
-            script_config_file_path = os.path.realpath(os.path.join(script_dir_abs_path, script_config_file))
+            script_config_file_path = os.path.join(script_dir_abs_path, script_config_file)
             script_config_file_name, script_config_file_ext = os.path.splitext(script_config_file)
 
             script_config = None
@@ -290,16 +500,22 @@ class CadLibrary:
 
             if script_config_file_ext == '.json':
                 try:
-                    script_config = json.load(open(script_config_file_path))
+                    script_config = self._read_json_file(script_config_file_path)
                 except Exception as e:
                     self.logger.error(f'CadLibrary::_parse_config(): Failed to parse JSON config file "{script_config_file_path}" for CadScript "{script_name}": {e}')
+                    return CadScript(name=script_name) # return default script (only name is required)
 
                 if script_config:
-                    self._set_params_keys_to_names(script_config)
-                    # naming priorities: config_file.name, script parent directory name ("script_dir_name") , script file name ("script_name")
-                    chosen_script_name = script_config.get('name') or script_dir_name or script_name
-                    base_script = CadScript(**{ 'name': chosen_script_name } | script_config) # CadScript needs a name
-                    base_script = self._upgrade_params(base_script, script_config)
+                    # NOTE: a config with the wrong structure or values should not stop loading the library
+                    try:
+                        self._set_params_keys_to_names(script_config)
+                        # naming priorities: config_file.name, script parent directory name ("script_dir_name") , script file name ("script_name")
+                        chosen_script_name = script_config.get('name') or script_dir_name or script_name
+                        base_script = CadScript(**{ 'name': chosen_script_name } | script_config) # CadScript needs a name
+                        base_script = self._upgrade_params(base_script, script_config)
+                    except Exception as e:
+                        self.logger.error(f'CadLibrary::_parse_config(): Failed to load JSON config file "{script_config_file_path}" for CadScript "{script_name}": {e}')
+                        base_script = None
                 
             elif script_config_file_ext == '.yaml' or script_config_file_ext == '.yml':
                 self.logger.warn('CadLibrary::_parse_config(): YML config files not implemented yet!')
@@ -317,13 +533,13 @@ class CadLibrary:
             'py' : 'cadquery',
             'js' : 'archiyou', 
         }
-        return EXT_TO_CODE_CAD_LANGUAGE.get(script_path_rel.split('.')[-1])
+        return EXT_TO_CODE_CAD_LANGUAGE.get(script_path_rel.rpartition('.')[2]) # extension without making a list of parts
 
     def _get_code_from_script_path(self, script_path_rel:str) -> str:
         """
             Get code inside the script
         """
-        script_path_abs = os.path.realpath(os.path.join(self.path, script_path_rel))
+        script_path_abs = os.path.join(self.path, script_path_rel)
 
         if not os.path.isfile(script_path_abs):
             self.logger.error('CadLibrary::_get_code_from_script_path: given path to script is not a file!')
@@ -338,7 +554,7 @@ class CadLibrary:
             Set script name key in dirs_by_script_name 
             for getting to script directories for caching 
         """
-        self.dirs_by_script_name[script_name] = os.path.realpath(os.path.join(self.path, os.path.dirname(script_path)))
+        self.dirs_by_script_name[script_name] = os.path.join(self.path, os.path.dirname(script_path))
 
             
     def _set_params_keys_to_names(self, script_config:dict) -> dict:
@@ -348,11 +564,11 @@ class CadLibrary:
                 v['name'] = k
 
         
-    def _upgrade_params(self, base_script:CadScript, script_config:dict) -> CadScript: 
+    def _upgrade_params(self, base_script:CadScript, script_config:dict, validate:bool=True) -> CadScript: 
         """
             Pydantic automatically parses the Param as ParamConfigBase
             Upgrade them according to the type field so we get ParamConfigNumber, ParamConfigText etc
-
+            Only skip validation (validate=False) for param data we wrote ourselves (like the script index)
         """
         TYPE_TO_PARAM_CLASS = {
             'number' : ParamConfigNumber,
@@ -364,8 +580,12 @@ class CadLibrary:
         new_params:Dict[str,ParamConfigNumber|ParamConfigText|ParamConfigBoolean|ParamConfigOptions] = {}
         for name, param in base_script.params.items():
             ParamClass = TYPE_TO_PARAM_CLASS.get(param.type) # name of type is already validated by Pydantic and models.ParamType enum
-            orig_param_data = list(filter( lambda param_conf: param_conf['name'] == param.name, script_config['params'].values()))[0]
-            new_params[name] = ParamClass(**orig_param_data)
+            orig_param_data = script_config['params'][name] # same keys: base_script.params is parsed from script_config['params']
+            if validate:
+                new_params[name] = ParamClass(**orig_param_data)
+            else:
+                # take over the enum values validated in the base param
+                new_params[name] = ParamClass.construct(**(orig_param_data | { 'type': param.type, 'units': param.units }))
 
         base_script.params = new_params
 
@@ -381,11 +601,30 @@ class CadLibrary:
     def _get_cached_script_file_path(self, script:CadScriptRequest) -> str:
         """
             Get the result.json in the cache
+            Paths that were found once are remembered so cache hits don't touch the disk
         """
 
+        cache_key = f'{script.name}/{script.hash()}'
+        cached_script_model_file = self._cached_script_files.get(cache_key)
+        if cached_script_model_file:
+            return cached_script_model_file
+
         cached_script_model_dir = self._get_script_cached_model_dir(script)
         cached_script_model_file = f'{cached_script_model_dir}/result.json'
-        return cached_script_model_file if Path(cached_script_model_file).is_file() else None
+        if Path(cached_script_model_file).is_file():
+            self._cached_script_files[cache_key] = cached_script_model_file
+            return cached_script_model_file
+        
+        return None
+
+    def _forget_cached_script(self, script:CadScriptRequest):
+        '''
+            Forget the remembered cache files of this script variant (when they are cleared or turn out to be removed)
+        '''
+        cache_key = f'{script.name}/{script.hash()}'
+        self._cached_script_files.pop(cache_key, None)
+        dropped_entries = self._cached_script_dicts.pop(cache_key, {})
+        self._cached_script_dicts_size -= sum(entry[2] for entry in dropped_entries.values())
 
 
     def get_cached_script(self, script:CadScriptRequest) -> CadScriptResult:
@@ -399,13 +638,94 @@ class CadLibrary:
             self.logger.error(f'CadLibrary::get_cached_script: Can not get cached script with name "{script.name}"!')
             return None
         else:
-            with open(cached_script_path) as f:
-                cached_script_dict = json.loads(f.read())
-                cached_script = CadScriptResult(**cached_script_dict)
-                # take over the request data 
-                cached_script.request = script.request
-                self._apply_single_model_format(cached_script)
-                return cached_script
+            try:
+                with open(cached_script_path, 'rb') as f:
+                    cached_script_dict = orjson.loads(f.read())
+            except FileNotFoundError:
+                # the cache was removed after we found it
+                self.logger.warn(f'CadLibrary::get_cached_script: Cached script "{cached_script_path}" was removed!')
+                self._forget_cached_script(script)
+                return None
+
+            cached_script = CadScriptResult(**cached_script_dict)
+            # take over the request data 
+            cached_script.request = script.request
+            self._apply_single_model_format(cached_script)
+            return cached_script
+
+    def get_cached_script_json(self, script:CadScriptRequest) -> bytes:
+        """
+            Get the cached CadScriptResult of this CadScriptRequest as JSON for a full API response
+            The result.json was written by us: skip Pydantic validation and serialization and just
+            set the request and the single requested model format like get_cached_script() does
+            Small results are kept in memory for as long as their result.json does not change
+        """
+
+        cached_script_path = self._get_cached_script_file_path(script) # result.json
+
+        if cached_script_path is None:
+            self.logger.error(f'CadLibrary::get_cached_script_json: Can not get cached script with name "{script.name}"!')
+            return None
+
+        try:
+            cached_script_stat = os.stat(cached_script_path)
+        except FileNotFoundError:
+            # the cache was removed after we found it
+            self.logger.warn(f'CadLibrary::get_cached_script_json: Cached script "{cached_script_path}" was removed!')
+            self._forget_cached_script(script)
+            return None
+
+        cache_key = f'{script.name}/{script.hash()}'
+        format = script.request.format
+        cached_script_version = (cached_script_stat.st_mtime_ns, cached_script_stat.st_size)
+        cached_script_entry = self._cached_script_dicts.get(cache_key, {}).get(format)
+
+        if cached_script_entry is not None and cached_script_entry[0] == cached_script_version:
+            cached_script_dict = cached_script_entry[1]
+            self._cached_script_dicts.move_to_end(cache_key)
+        else:
+            try:
+                with open(cached_script_path, 'rb') as f:
+                    cached_script_dict = orjson.loads(f.read())
+            except FileNotFoundError:
+                self.logger.warn(f'CadLibrary::get_cached_script_json: Cached script "{cached_script_path}" was removed!')
+                self._forget_cached_script(script)
+                return None
+
+            # only the requested model format (see _apply_single_model_format)
+            if format is not None:
+                needed_model_format = cached_script_dict['results']['models'].get(format)
+                cached_script_dict['results']['models'] = {}
+                if needed_model_format:
+                    cached_script_dict['results']['models'][format] = needed_model_format
+                else:
+                    self.logger.error(f'CadLibrary::get_cached_script_json: No model in format {format} found!')
+
+            self._remember_cached_script_dict(cache_key, format, cached_script_version, cached_script_dict, cached_script_stat.st_size)
+
+        # take over the request data (don't change the dict in memory)
+        return orjson.dumps(cached_script_dict | { 'request': script.request.dict() })
+
+    def _remember_cached_script_dict(self, cache_key:str, format:str, version:Tuple[int,int], cached_script_dict:dict, cached_script_size:int):
+        """
+            Keep a parsed result in memory: only small ones and within CACHED_SCRIPT_DICTS_MAX_SIZE in total
+            The size is that of the whole result.json: an upper bound for what we keep of it
+        """
+
+        if cached_script_size > self.CACHED_SCRIPT_DICT_MAX_SIZE:
+            return
+
+        cached_script_entries = self._cached_script_dicts.setdefault(cache_key, {})
+        if format in cached_script_entries:
+            self._cached_script_dicts_size -= cached_script_entries[format][2]
+        cached_script_entries[format] = (version, cached_script_dict, cached_script_size)
+        self._cached_script_dicts_size += cached_script_size
+        self._cached_script_dicts.move_to_end(cache_key)
+
+        # drop the least recently used results
+        while self._cached_script_dicts_size > self.CACHED_SCRIPT_DICTS_MAX_SIZE:
+            _, dropped_entries = self._cached_script_dicts.popitem(last=False)
+            self._cached_script_dicts_size -= sum(entry[2] for entry in dropped_entries.values())
 
     def get_cached_model(self, script:CadScriptRequest) -> Any:
 
@@ -418,12 +738,17 @@ class CadLibrary:
         cached_script_dir = self._get_script_cached_model_dir(script)
         cached_model_path = f'{cached_script_dir}/result.{script.request.format}'
 
-        if os.path.exists(cached_model_path) is False:
-            self.logger.error(f'CadLibrary::get_cached_model: Cannot get requested model from cache for script "{script.name}"')
+        # one stat for both the check and the response (FileResponse does not stat again if given)
+        try:
+            cached_model_stat = os.stat(cached_model_path)
+        except FileNotFoundError:
+            self.logger.warn(f'CadLibrary::get_cached_model: Cannot get requested model from cache for script "{script.name}"')
+            if not os.path.isfile(f'{cached_script_dir}/result.json'):
+                self._forget_cached_script(script) # the cache was removed after we found it
             return None
-        else:
-            output_model_filename = f'{script.name}-{script.hash()}.{script.request.format}'
-            return FileResponse(cached_model_path, filename=output_model_filename)
+
+        output_model_filename = f'{script.name}-{script.hash()}.{script.request.format}'
+        return FileResponse(cached_model_path, stat_result=cached_model_stat, filename=output_model_filename)
 
 
     def _apply_single_model_format(self, script:CadScriptResult) -> CadScriptResult:
@@ -458,11 +783,21 @@ class CadLibrary:
             return False
 
         script_request_dir_path = self._get_script_cached_model_dir(script)
-        Path(script_request_dir_path).mkdir(parents=True, exist_ok=True) # check and make needed dirs if not exist
-        # to avoid all kinds of problems clear the directory before writing the task file
-        self._clear_dir(script_request_dir_path)
+        try:
+            os.makedirs(script_request_dir_path) # a new directory is empty: nothing to clear
+        except FileExistsError:
+            # to avoid all kinds of problems clear the directory before writing the task file
+            self._clear_dir(script_request_dir_path)
+        self._forget_cached_script(script)
+
+        compute_file_path = f'{script_request_dir_path}/{task_id}{self.COMPUTE_FILE_EXT}' # {library_path}/{component}/{component}-cache/{param hash}/{task_id}
+        try:
+            # create the compute file in one call. It only fails if this task was already set to computing
+            compute_file = os.open(compute_file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return True
 
-        with open(f'{script_request_dir_path}/{task_id}{self.COMPUTE_FILE_EXT}', 'w') as fp: # {library_path}/{component}/{component}-cache/{param hash}/{task_id}
+        with os.fdopen(compute_file, 'w') as fp:
             fp.write(script.json()) # write requested script in file for convenience. It is also used to track calculation time
 
         return True
@@ -474,33 +809,36 @@ class CadLibrary:
         """
         script_request_dir = f'{self._get_script_cache_dir(script_name)}/{script_instance_hash}'
 
-        if os.path.exists(script_request_dir):
-            files = os.listdir(script_request_dir)
-            
-            if len(files) > 0:
-                first_file = files[0]
-                path, ext = os.path.splitext(first_file)
-                if ext == self.COMPUTE_FILE_EXT: # .compute extension for robustness
-                    self.logger.info(f'ModelRequestHandler::check_script_model_computing_job: Found computing file = "{files[0]}"')
-                    task_id = files[0].replace(self.COMPUTE_FILE_EXT, '') # name of file is the task_id
+        # one directory scan (no exists check and file list) that stops at the compute file
+        compute_file_name = None
+        try:
+            with os.scandir(script_request_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(self.COMPUTE_FILE_EXT): # .compute extension for robustness
+                        compute_file_name = entry.name
+                        break
+        except FileNotFoundError:
+            return None
 
-                    job = ModelComputeJob(celery_task_id=task_id)
+        if compute_file_name is None:
+            return None # probably cached files
 
-                    try:
-                        with open(f'{script_request_dir}/{first_file}', 'r') as f:
-                            requested_script_dict = json.loads(f.read())
-                            requested_script = CadScriptRequest(**requested_script_dict)
-                            job.script = requested_script
-                            job.elapsed_time = round((datetime.now() - requested_script.request.created_at).total_seconds() * 1000)
-                    except Exception as e:
-                        # avoid all kinds of errors for nothing essential
-                        self.logger.error(f'CadLibrary::check_script_model_computing_job: ERROR: "{e}"')
+        self.logger.info(f'ModelRequestHandler::check_script_model_computing_job: Found computing file = "{compute_file_name}"')
+        task_id = compute_file_name[:-len(self.COMPUTE_FILE_EXT)] # name of file is the task_id
 
-                    return job
-                else:
-                    return None # probably cached files
-            
-        return None
+        job = ModelComputeJob(celery_task_id=task_id)
+
+        try:
+            with open(f'{script_request_dir}/{compute_file_name}', 'rb') as f:
+                requested_script_dict = orjson.loads(f.read())
+                requested_script = CadScriptRequest(**requested_script_dict)
+                job.script = requested_script
+                job.elapsed_time = round((datetime.now() - requested_script.request.created_at).total_seconds() * 1000)
+        except Exception as e:
+            # avoid all kinds of errors for nothing essential
+            self.logger.error(f'CadLibrary::check_script_model_computing_job: ERROR: "{e}"')
+
+        return job
         
     def remove_script_model_is_computing_job(self, script:CadScriptResult|CadScriptRequest) -> bool:
 
@@ -516,58 +854,86 @@ class CadLibrary:
     
     def _get_script_cache_dir(self, script_name:str) -> str:
         #  {library_path}/{component}/{component}-cache
-        script_dir_path = self._get_script_filedir_path(script_name)
-        return f'{script_dir_path}/{script_name}-cache'
+        # NOTE: used for every cache check: the directories are kept until scripts are (re)loaded
+        script_cache_dir = self._script_cache_dirs.get(script_name)
+        if script_cache_dir is None:
+            script_dir_path = self._get_script_filedir_path(script_name)
+            script_cache_dir = f'{script_dir_path}/{script_name}-cache'
+            if script_dir_path is not None:
+                self._script_cache_dirs[script_name] = script_cache_dir
+        
+        return script_cache_dir
 
     def _get_script_filedir_path(self, script_name:str) -> str:
         if self.source == 'file':
-            return os.path.join(os.path.realpath(self.path), script_name)
+            return os.path.join(self.path, script_name)
         else:
             return self.dirs_by_script_name.get(script_name)
     
     def _clear_dir(self, dir_path) -> bool:
-        for path in Path(dir_path).glob("**/*"):
-            if path.is_file():
-                path.unlink()
-            elif path.is_dir():
-                rmtree(path)
+        # remove all contents of directory: remove the whole tree at once and make the empty directory again
+        rmtree(dir_path, ignore_errors=True)
+        os.makedirs(dir_path, exist_ok=True)
+
+        return True
 
     def _clear_computing_files(self) -> bool:
 
-        for path in Path(self.path).glob("**/*"):
-            if path.is_file() and path.suffix == self.COMPUTE_FILE_EXT:
-                path.unlink()
+        # walk library with os.scandir: no Path instances and extra stat calls for every file
+        dir_paths = [self.path]
+        while dir_paths:
+            dir_path = dir_paths.pop()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            dir_paths.append(entry.path)
+                        elif entry.name.endswith(self.COMPUTE_FILE_EXT) and entry.is_file(follow_symlinks=False):
+                            try:
+                                os.unlink(entry.path)
+                            except FileNotFoundError:
+                                pass # already removed by another API worker that is starting
+            except OSError as e:
+                # an unreadable (or just removed) directory in the library should not stop the API from starting
+                self.logger.warn(f'CadLibrary::_clear_computing_files: Skipped directory "{dir_path}": {e}')
 
         self.logger.info('CadLibrary::_clear_computing_files: Cleared old compute files!')
 
         return True
 
-    def checkin_script_result_in_cache_and_return(self, script_result:CadScriptResult) -> Response|FileResponse: # return a raw Starlette/FastAPI response with json content
-
-        script_result_json = script_result.json()
+    def checkin_script_result_in_cache_and_return(self, script_result:CadScriptResult, overwrite:bool=False) -> Response|FileResponse: # return a raw Starlette/FastAPI response with json content
+        '''
+            Set a computed script result in the cache (if cachable) and return it as response
+            overwrite=False keeps a result that is already cached (by an earlier or racing API request)
+            The request hash does not include the code of the script: use overwrite=True when (re)computing the cache
+        '''
 
         # cache if cachable
         result_cache_dir = f'{self._get_script_cache_dir(script_result.name)}/{script_result.request.hash}'
 
         if script_result.is_cachable():
-            # place total JSON response in cache
-            Path(result_cache_dir).mkdir(parents=True, exist_ok=True)
+            result_json_path = f'{result_cache_dir}/result.json'
 
             # save results to file
-            if len(script_result.results.models.keys()) > 0: # only when some models as results
-                with open(f'{result_cache_dir}/result.json', 'w') as f:
-                    f.write(script_result_json)
+            if not overwrite and os.path.isfile(result_json_path):
+                # the same request hash gives the same models: an earlier (or racing) compute already cached them
+                self._cached_script_files[f'{script_result.name}/{script_result.request.hash}'] = result_json_path
+            elif len(script_result.results.models.keys()) > 0: # only when some models as results
+                Path(result_cache_dir).mkdir(parents=True, exist_ok=True)
                 if script_result.results.models.get('step'):
                     with open(f'{result_cache_dir}/result.step', 'w') as f:
                         f.write(script_result.results.models['step'])
                 if script_result.results.models.get('stl'):
                     with open(f'{result_cache_dir}/result.stl', 'wb') as f:
-                        stl_binary = base64.b64decode(script_result.results.models['stl']) # decode base64
-                        f.write(stl_binary)
+                        f.write(base64.b64decode(script_result.results.models['stl'])) # decode base64
                 if script_result.results.models.get('gltf'):
                     with open(f'{result_cache_dir}/result.gltf', 'wb') as f:
-                        gltf_binary = base64.b64decode(script_result.results.models['gltf']) # decode base64
-                        f.write(gltf_binary)
+                        f.write(base64.b64decode(script_result.results.models['gltf'])) # decode base64
+                # place total JSON response in cache last: if it exists, the model files are complete (see is_cached())
+                # NOTE: only serialize the full result (with all model formats) when it is cached
+                with open(result_json_path, 'w') as f:
+                    f.write(script_result.json())
+                self._cached_script_files[f'{script_result.name}/{script_result.request.hash}'] = result_json_path
 
                 #self.logger.info(f'CadLibrary::checkin_script_result_in_cache_and_return(): Model variant cached in directory: {result_cache_dir} [{batch_count_str}]')
             else:
@@ -611,22 +977,18 @@ class CadLibrary:
 
     #### CACHE PRE CALCULATION AND ADMIN ####
 
-    async def _submit_and_handle_compute_script_task(self, script:CadScript, param_values:dict, batch_id:str=None) -> CadScriptResult:
+    def _handle_cache_compute_script_result(self, script_result:CadScriptResult) -> CadScriptResult:
         """
-            Submit script to compute workers and wait and handle the result asynchronously 
-            The result is set in the cache on disk
+            Set a pre-computed script result in the cache and keep track of its batch
         """
-    
-        script_request = self._make_cache_compute_script_request(script, param_values, batch_id)
-        script_result = await self.request_handler.compute_script_request(script_request)
-        
-        self.checkin_script_result_in_cache_and_return(script_result)
+
+        self.checkin_script_result_in_cache_and_return(script_result, overwrite=True) # the script code can have changed since the cache was made
 
         batch_id = script_result.request.batch_id
         batch_count = self._compute_batch_counters[batch_id] if batch_id else None
         batch_total = self._compute_batch_totals[batch_id] if batch_id else None
         batch_count_str = f'Batch count: {batch_count}/{batch_total}' if batch_id is not None else ''
-        self.logger.info(f'CadLibrary::_submit_compute_script_task(): Script "{script_result.name}": model "{script_result.request.hash}" submitted and handled. Took: {script_result.results.duration} ms. {batch_count_str}')
+        self.logger.info(f'CadLibrary::_handle_cache_compute_script_result(): Script "{script_result.name}": model "{script_result.request.hash}" submitted and handled. Took: {script_result.results.duration} ms. {batch_count_str}')
 
         # detect end of batch
         if batch_id and (batch_count == batch_total):
@@ -634,8 +996,6 @@ class CadLibrary:
             del self._compute_batch_counters[batch_id]
             del self._compute_batch_totals[batch_id]
             # do something more later
-            
-
 
         return script_result
 
@@ -656,24 +1016,10 @@ class CadLibrary:
             self.logger.error(f'CadLibrary::compute_script_cache: Script is not cachable!')
             return False
 
-        # setup batch info
-        num_variants = script.get_num_variants()
-        compute_batch_id = str(uuid.uuid4())
-        self._compute_batch_counters[compute_batch_id] = 0
-        self._compute_batch_totals[compute_batch_id] = num_variants
+        compute_batch_id, compute_group_result = self._send_script_variants_to_compute(script)
+        self._handle_script_variants_results(compute_batch_id, compute_group_result)
 
-        self.logger.info(f'==== START COMPUTE CACHE FOR SCRIPT "{script.name}" with {num_variants} model variants ====')
-        
-        async_compute_tasks = []            
-        for hash,param_values in script.iterate_possible_model_params_dicts():
-            # NOTE: hash is omitted
-            async_compute_tasks.append(self._submit_and_handle_compute_script_task(script, param_values,compute_batch_id))
-    
-        loop = asyncio.get_event_loop()
-        #tasks = asyncio.gather(*async_compute_tasks)
-        tasks = asyncio.wait(async_compute_tasks) # use wait instead of gather because its easier
-        loop.run_until_complete(tasks) # results are already handled
-        loop.close()
+        return True
 
 
     def compute_cache(self):
@@ -685,23 +1031,92 @@ class CadLibrary:
         from .ModelRequestHandler import ModelRequestHandler # keep this from the normal imports
         self.request_handler = ModelRequestHandler(library=self)
         
-        async_compute_tasks = []
+        # first send the variants of all scripts so the workers never wait on us
+        compute_group_results = [self._send_script_variants_to_compute(script) for script in self.scripts if script.is_cachable()]
 
-        for script in self.scripts:
-            if script.is_cachable():
-                param_values_sets = script.all_possible_model_params_dicts() # { hash : { param_name: value, .. }}
+        for compute_batch_id, compute_group_result in compute_group_results:
+            self._handle_script_variants_results(compute_batch_id, compute_group_result)
 
-                self.logger.info(f'==== START COMPUTE CACHE FOR SCRIPT "{script.name}" with {len(param_values_sets.items())} models ====')
-                
-                for hash,param_values in param_values_sets.items():
-                    # NOTE: hash is omitted
-                    async_compute_tasks.append(self._submit_and_handle_compute_script_task(script, param_values))
-    
-        loop = asyncio.get_event_loop()
-        tasks = asyncio.gather(*async_compute_tasks)
-        loop.run_until_complete(tasks) # results are already handled
-        loop.close()
+
+    def _send_script_variants_to_compute(self, script:CadScript) -> Tuple[str,GroupResult]:
+        '''
+            Send all model variants of a script to the workers in one Celery group so they are computed in parallel
+            Returns the batch id and the group result
+        '''
+
+        # setup batch info
+        num_variants = script.get_num_variants()
+        compute_batch_id = str(uuid.uuid4())
+        self._compute_batch_counters[compute_batch_id] = 0
+        self._compute_batch_totals[compute_batch_id] = num_variants
+
+        self.logger.info(f'==== START COMPUTE CACHE FOR SCRIPT "{script.name}" with {num_variants} model variants ====')
+
+        self._check_script_cache_hash_version(script)
         
+        task_method = self.request_handler.get_celery_task_method(script)
+        compute_group = group(
+            task_method.s(script=self._make_cache_compute_script_request(script, param_values, compute_batch_id).json())
+            for hash,param_values in script.iterate_possible_model_params_dicts() # NOTE: hash is omitted
+        )
+        
+        return compute_batch_id, compute_group.apply_async()
+
+    def _check_script_cache_hash_version(self, script:CadScript) -> bool:
+        '''
+            Cached variants are in directories by request hash. When the hash input changed (see CadScript.HASH_VERSION)
+            the old directories are never used again: clear the cache of the script before it is pre-computed
+            Returns True if the cache was cleared
+        '''
+
+        script_cache_dir = self._get_script_cache_dir(script.name)
+        if script_cache_dir is None:
+            return False
+
+        hash_version_path = f'{script_cache_dir}/{self.CACHE_HASH_VERSION_FILE}'
+        try:
+            with open(hash_version_path, 'r') as f:
+                cache_hash_version = f.read().strip()
+        except FileNotFoundError:
+            cache_hash_version = None
+
+        if cache_hash_version == str(HASH_VERSION):
+            return False
+
+        self.logger.info(f'CadLibrary::_check_script_cache_hash_version(): Cache of script "{script.name}" has hash version "{cache_hash_version}" instead of "{HASH_VERSION}". Cleared!')
+        self._clear_dir(script_cache_dir)
+        # forget all remembered cache files (simple: this only happens once after a hash change)
+        self._cached_script_files = {}
+        self._cached_script_dicts = OrderedDict()
+        self._cached_script_dicts_size = 0
+
+        with open(hash_version_path, 'w') as f:
+            f.write(str(HASH_VERSION))
+
+        return True
+
+    def _handle_script_variants_results(self, batch_id:str, compute_group_result:GroupResult):
+        '''
+            Wait for all results of a group of model variants and set them in the cache (in order)
+            A failed variant is logged and skipped: it should not stop the other variants from being cached
+        '''
+
+        num_failed = 0
+        for task_result in compute_group_result.results:
+            try:
+                script_result_dict = task_result.get(propagate=False)
+                if task_result.failed():
+                    raise Exception(script_result_dict) # with propagate=False we get the exception of the worker
+                self._handle_cache_compute_script_result(CadScriptResult(**script_result_dict))
+            except Exception as e:
+                num_failed += 1
+                self.logger.error(f'CadLibrary::_handle_script_variants_results(): Model variant of task "{task_result.id}" in batch "{batch_id}" failed. Skipped! Error: {e}')
+
+        # failed variants are never counted: end the batch here
+        if batch_id in self._compute_batch_counters:
+            self.logger.info(f'==== END OF BATCH "{batch_id}" ({num_failed} failed) ====')
+            del self._compute_batch_counters[batch_id]
+            del self._compute_batch_totals[batch_id]
 
 
     def _make_cache_compute_script_request(self, script:CadScript, param_dict:dict, batch_id:str=None) -> CadScriptRequest:
@@ -727,25 +1142,12 @@ class CadLibrary:
 
     #### UTILS ####
 
-    def _setup_logger(self):
-
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(level=logging.INFO)
-
-        try:
-            handler = logging.StreamHandler()
-            handler.setLevel(logging.INFO)
-            formatter = logging.Formatter('%(asctime)s %(name)s %(levelname)-4s %(message)s')
-            handler.setFormatter(formatter)
-
-            if (self.logger.hasHandlers()):  # see: http://tiny.cc/v5w6gz
-                self.logger.handlers.clear()
-
-            self.logger.addHandler(handler)
-
-        except Exception as e:
-            self.logger.error(e)
-
+    def _read_json_file(self, file_path:str) -> Any:
+        '''
+            Parse a JSON file with orjson (and close it)
+        '''
+        with open(file_path, 'rb') as f:
+            return orjson.loads(f.read())
     
     def _check_path(self, rel_path:str) -> str:
         # rel_path is related to the root of this project (occilib/..)
@@ -777,7 +1179,7 @@ class CadLibrary:
         
         if type(code) is not str:
             return 0
-        return len(code.split('\n'))
+        return code.count('\n') + 1 # count instead of making a list of lines (same as len(code.split('\n')))
 
 
 
@@ -7,14 +7,17 @@
 
 import os, os.path
 import logging
+from functools import lru_cache
 from datetime import datetime
 from pathlib import Path
 from dotenv import dotenv_values
+import orjson
 
 from pydantic import BaseModel
 import whoosh.fields
 from whoosh.fields import Schema as WhooshSchema
-from whoosh.index import FileIndex, create_in, open_dir
+from whoosh.index import Index
+from whoosh.filedb.filestore import RamStorage
 
 from whoosh.qparser import MultifieldParser
 import whoosh.qparser
@@ -28,25 +31,24 @@ CONFIG = dotenv_values()
 class CadLibrarySearch:
 
     #### SETTINGS ####
-    SEARCH_INDEX_DIRNAME = 'library_index'
     SEARCHABLE_FIELDS = ['name', 'author', 'org', 'description', 'units', 'code', 'script_cad_language']
+    SEARCH_RESULTS_CACHE_SIZE = 1024 # number of queries of which the results are kept in memory
 
     library = None
     parser:MultifieldParser = None
-    index:FileIndex = None
+    index:Index = None
 
     def __init__(self, library):
         
-        self._setup_logger()
+        self.logger = logging.getLogger(__name__) # handlers are configured by the app (see main.py)
         self.library = library
         self.build_index()
 
     def build_index(self):
 
         schema = self._pydantic_model_to_whoosh_schema(CadScript)
-        lib_dir_path = f'{self.library.path}/{self.SEARCH_INDEX_DIRNAME}'
-        Path(lib_dir_path).mkdir(parents=True, exist_ok=True)
-        self.index = create_in(lib_dir_path, schema)
+        # the index is rebuilt on every start: keep it in memory so every API worker process has its own
+        self.index = RamStorage().create_index(schema)
         index_writer = self.index.writer()
         for script in self.library.latest_scripts.values(): # for now only show latest scripts in search!
             index_writer.add_document(**script.dict())
@@ -60,8 +62,20 @@ class CadLibrarySearch:
         # add fuzzy text search
         self.parser.add_plugin(whoosh.qparser.FuzzyTermPlugin())
 
+        # the index does not change after building, so results of the same query can be reused
+        # NOTE: they are cached as JSON bytes: every caller gets its own results to change
+        self._cached_search_json = lru_cache(maxsize=self.SEARCH_RESULTS_CACHE_SIZE)(self._search_json)
+
     def search(self, q:str) -> List[CadScript]:
 
+        return orjson.loads(self._cached_search_json(q))
+
+    def _search_json(self, q:str) -> bytes:
+
+        return orjson.dumps(self._search(q))
+
+    def _search(self, q:str) -> List[CadScript]:
+
         # Add search fuzzyness of distance 1. See: https://whoosh.readthedocs.io/en/latest/parsing.html
         q += '~1'
         query_obj = self.parser.parse(q)
@@ -113,26 +127,3 @@ class CadLibrarySearch:
                 whoosh_fields[name] = UNKNOWN_WHOOSH_FIELD
 
         return WhooshSchema(**whoosh_fields)
-
-
-
-    #### UTILS ####
-
-    def _setup_logger(self):
-
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(level=logging.INFO)
-
-        try:
-            handler = logging.StreamHandler()
-            handler.setLevel(logging.INFO)
-            formatter = logging.Formatter('%(asctime)s %(name)s %(levelname)-4s %(message)s')
-            handler.setFormatter(formatter)
-
-            if (self.logger.hasHandlers()):  # see: http://tiny.cc/v5w6gz
-                self.logger.handlers.clear()
-
-            self.logger.addHandler(handler)
-
-        except Exception as e:
-            self.logger.error(e)
\ No newline at end of file
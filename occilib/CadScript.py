@@ -9,28 +9,35 @@
 
 from datetime import datetime
 from typing import List, Any, Dict, Tuple, Iterator
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr, Field
 import hashlib
 import base64
 import json
+import orjson
 import itertools
 
+from .models import orjson_dumps
 from .models import ScriptCadLanguage, ModelContentLicense, ModelResult, ModelFormat, ModelQuality, RequestResultFormat, ModelUnits, EndpointStatus
 from .Param import ParamConfigBase, ParamConfigNumber, ParamConfigText, ParamConfigBoolean, ParamConfigOptions, ParamInstance
 
+# raise when the input of CadScript.hash() changes: cached variants are in directories by hash
+# and are cleared when pre-computing the cache of a script with another hash version (see CadLibrary)
+# 2: whole floats are hashed as ints, falsy param values are part of the request
+HASH_VERSION = 2
+
 
 class ModelRequest(BaseModel):
     """
         Request to execute CadScript with given params and output form
     """
-    created_at:datetime = datetime.now()
+    created_at:datetime = Field(default_factory=datetime.now) # set per instance, not once at import
     hash:str = None # name+param+values hash id
-    params: Dict[str, ParamInstance] = {}
+    params: Dict[str, ParamInstance] = Field(default_factory=dict)
     format: ModelFormat = 'step' # requested output format of the model
     output: RequestResultFormat = None
     quality: ModelQuality = 'high' # TODO
     batch_id: str = None # some id to group requests 
-    meta: dict = {} # TODO
+    meta: dict = Field(default_factory=dict) # TODO
     
 
     def get_param_query_string(self) -> str:
@@ -54,6 +61,11 @@ class CadScript(BaseModel):
     the different steps of CADScript handling: parsing, compute request, compute and results
 
     """
+
+    class Config:
+        json_loads = orjson.loads
+        json_dumps = orjson_dumps # model.json() is used for cache files, compute tasks and API output
+
     id:str = None # unique id for this script {org}/{name}/{version}
     namespace:str = None # unique endpoint namespace {org}/{name}
     status:EndpointStatus = 'success'
@@ -64,25 +76,28 @@ class CadScript(BaseModel):
     version:str = None
     url:str = None # url of the endpoint where the script can be found
     description:str = None 
-    created_at:datetime = datetime.now()
-    updated_at:datetime = datetime.now()
+    created_at:datetime = Field(default_factory=datetime.now)
+    updated_at:datetime = Field(default_factory=datetime.now)
     prev_version:str = None
     safe:bool = False # if validated as safe code (not implemented yet)
     published:bool = True # if available to the public
     units:ModelUnits = None
-    params:Dict[str, ParamConfigBase | ParamConfigNumber | ParamConfigText | ParamConfigBoolean | ParamConfigOptions ] = {} # list of param definitions - TODO: combine ParamTypes
-    param_presets:Dict[str, dict] = {} # TODO: presets of parameters by name and then a { param_name: value } dict
+    params:Dict[str, ParamConfigBase | ParamConfigNumber | ParamConfigText | ParamConfigBoolean | ParamConfigOptions ] = Field(default_factory=dict) # list of param definitions - TODO: combine ParamTypes
+    param_presets:Dict[str, dict] = Field(default_factory=dict) # TODO: presets of parameters by name and then a { param_name: value } dict
     public_code: bool = False # if public user of the API can see the source code of the CAD script
     code: str  = None# the code of the CAD script
     script_cad_language:ScriptCadLanguage = None # cadquery, archiyou or openscad (and many more may follow)
     script_cad_version:str = None # not used currently
     script_cad_engine_config:dict = None # plug all kind of specific script cad engine config in here
-    meta:dict = {} # TODO: Remove? Generate tag for FastAPI on the fly
+    meta:dict = Field(default_factory=dict) # TODO: Remove? Generate tag for FastAPI on the fly
+
+    _request_params_hash:Tuple[dict,str] = PrivateAttr(default=None) # (hashed request.params, hash)
 
     def hash(self, params: Dict[str, ParamInstance]=None) -> str:
         """
             Hash a given dict of ParamInstance parameters. 
             If not given we check if self is a CadScriptRequest and has request.params and use that
+            The hash of request.params is memoized: replace request.params (don't mutate it) to get a new hash
         """
         
         # if params is not given we try to get is from the script.request
@@ -95,18 +110,32 @@ class CadScript(BaseModel):
                 return None
 
             params = self.request.params
+            # same params object as last time: hash is still valid
+            if self._request_params_hash is not None and self._request_params_hash[0] is params:
+                self.request.hash = self._request_params_hash[1]
+                return self.request.hash
+            request_params = params
+        else:
+            request_params = None
 
         # NOTE: params can be None if no parameters
         params_str = ''
         if params and len(params.keys()) > 0:
             for name,param in params.items():
-                params_str += f'{name}={json.dumps(dict(param))}&'
+                param_dict = dict(param)
+                # canonical value: a whole float (from param ranges) and an int (from API input) are the same model
+                if isinstance(param.value, float) and param.value.is_integer():
+                    param_dict['value'] = int(param.value)
+                params_str += f'{name}={json.dumps(param_dict)}&'
         
         hash = self._hash(self.name + params_str)
         
         # set hash on request too (if available)
         if hasattr(self, 'request'):
             self.request.hash = hash
+        
+        if request_params is not None:
+            self._request_params_hash = (request_params, hash)
 
         return hash
 
@@ -137,12 +166,14 @@ class CadScript(BaseModel):
         if self.is_cachable() is False:
             return {}
 
-        all_values_per_parameter = []
-        for param in self.params.values():
-            all_values_per_parameter.append(param.values())
+        return dict(self.iterate_possible_model_params_dicts())
+                    
+    
+    def iterate_possible_model_params_dicts(self) -> Iterator[Tuple[str, dict]]: # hash, { param1: { value: x }}
 
-        all_combinations = list(itertools.product(*all_values_per_parameter))
-        """ the combinations are generated from the starting value 
+        '''
+            Iterator over all combinations of param values
+            The combinations are generated from the starting value 
             and then iterated from the last list to the first
             
             Example: 
@@ -150,48 +181,17 @@ class CadScript(BaseModel):
             - param2: [10,11,12]
             combinations:
                 [[1,10],[1,11],[1,12],[2,10],[2,11],[2,12] etc] 
-        """
-
-        all_model_param_sets = {}
-
-        for combination in all_combinations:
-            param_values = {}
-            for index,value in enumerate(combination):
-                param_name = list(self.params.values())[index].name
-                param_values[param_name] = value
-
-            # place with hash 
-            # convert to Dict[ParamInstance] # TODO: remove this in between step eventually
-            param_set:Dict[Dict[ParamInstance]] = {}
-            for k,v in param_values.items():
-                param_set[k] = ParamInstance(value=v)
-
-            param_set_hash = self.hash(param_set)
-            all_model_param_sets[param_set_hash] = param_values
-
-        return all_model_param_sets
-                    
-    
-    def iterate_possible_model_params_dicts(self) -> Iterator[Tuple[str, dict]]: # hash, { param1: { value: x }}
-
-        '''
-            Iterator over all combinations of param values
         '''
 
-        all_values_per_parameter = []
-        for param in self.params.values():
-            all_values_per_parameter.append(param.values())
+        # materialize names and values once instead of per combination
+        param_names = tuple(param.name for param in self.params.values())
+        all_values_per_parameter = [param.values() for param in self.params.values()]
 
         for combination in itertools.product(*all_values_per_parameter):
-            param_values = {}
-            for index,value in enumerate(combination):
-                param_name = list(self.params.values())[index].name
-                param_values[param_name] = value
+            param_values = dict(zip(param_names, combination))
 
             # convert to Dict[ParamInstance] # TODO: remove this in between step eventually
-            param_set:Dict[Dict[ParamInstance]] = {}
-            for k,v in param_values.items():
-                param_set[k] = ParamInstance(value=v)
+            param_set:Dict[str,ParamInstance] = { k: ParamInstance(value=v) for k,v in param_values.items() }
 
             param_set_hash = self.hash(param_set)
             yield param_set_hash, param_values
@@ -217,7 +217,7 @@ class CadScriptRequest(CadScript):
         CadScript that is used to make a request
     """
     
-    request:ModelRequest = ModelRequest() # just make an empty ModelRequest instance
+    request:ModelRequest = Field(default_factory=ModelRequest) # just make an empty ModelRequest instance
 
     def get_param_values_dict(self) -> dict:
         """
@@ -234,6 +234,11 @@ class CadScriptRequest(CadScript):
 
 
 class ModelComputeJob(BaseModel):
+
+    class Config:
+        json_loads = orjson.loads
+        json_dumps = orjson_dumps
+
     status:EndpointStatus = 'working'
     celery_task_id:str = None
     celery_task_status:str = None
@@ -245,7 +250,7 @@ class CadScriptResult(CadScriptRequest):
     """
         CadScript that has been through compute and has results
     """
-    results:ModelResult = ModelResult()
+    results:ModelResult = Field(default_factory=ModelResult)
     
 
 
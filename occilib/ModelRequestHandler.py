@@ -52,7 +52,7 @@ class ModelRequestHandler():
 
     def __init__(self, library:CadLibrary):
             
-        self._setup_logger()
+        self.logger = logging.getLogger(__name__) # handlers are configured by the app (see main.py)
         self.library = library
 
         if not isinstance(self.library, CadLibrary):
@@ -186,18 +186,17 @@ class ModelRequestHandler():
             self.logger.error(m)
             raise HTTPException(500, detail=m) # raise http exception to give server error
 
-        script = self.library.get_script_request(org=req.script_org, name=req.script_name) # this gets the latest version
+        # only for reading: no need to upgrade to a CadScriptRequest here
+        script = self.library.get_script(org=req.script_org, name=req.script_name) # this gets the latest version
 
         # special entity request (special_requested_entity)
         if req.script_special_requested_entity is not None:
             # check if script exists
+            # NOTE: these are serialized once per script and returned as ready responses (no FastAPI jsonable_encoder)
             if script:
-                if req.script_special_requested_entity == 'versions':
-                    return self.library.get_script_versions(name=script.name)
-                elif req.script_special_requested_entity == 'params':
-                    return script.params
-                elif req.script_special_requested_entity == 'presets':
-                    return script.param_presets
+                entity_json = self.library.get_script_entity_json(script, req.script_special_requested_entity)
+                if entity_json is not None:
+                    return Response(content=entity_json, media_type='application/json')
 
         # always make sure we have a version, redirect if needed
         if req.script_version is None:
@@ -210,41 +209,47 @@ class ModelRequestHandler():
             self.logger.info(f'**** {requested_script.name}: CACHE HIT FOR REQUEST [format="{req.format}" output="{req.output}"] ****')
             # API user requested a full CadScriptResult response
             if requested_script.request.output == 'full':
-                cached_script = self.library.get_cached_script(requested_script)
-                return cached_script
+                # serve the cached JSON without parsing it into a CadScriptResult and serializing it again
+                cached_script_json = self.library.get_cached_script_json(requested_script)
+                if cached_script_json is not None:
+                    return Response(content=cached_script_json, media_type='application/json')
             else:
                 # only a specific format model as output (we skip loading the result.json and serve the model file directly)
-                return self.library.get_cached_model(requested_script)
-
+                cached_model = self.library.get_cached_model(requested_script)
+                if cached_model is not None:
+                    return cached_model
+                if self.library.is_cached(requested_script): # the result is cached, but without a model in this format
+                    raise HTTPException(status_code=404, detail=f'No model in format "{req.format}" available for this request!')
+            # the cache was removed after we found it: compute again
+
+        # no cache - but already computing?
+        self.logger.info(f'**** {requested_script.name}: COMPUTE ****')
+
+        computing_job = self.library.check_script_model_computing_job(requested_script.name, requested_script.hash())
+        if computing_job is not None:
+            # refer back to compute url
+            return self.got_to_computing_job_url(requested_script,computing_job.celery_task_id, set_compute_status=False)
         else:
-            # no cache - but already computing?
-            self.logger.info(f'**** {requested_script.name}: COMPUTE ****')
-
-            computing_job = self.library.check_script_model_computing_job(requested_script.name, requested_script.hash())
-            if computing_job is not None:
-                # refer back to compute url
-                return self.got_to_computing_job_url(requested_script,computing_job.celery_task_id, set_compute_status=False)
-            else:
-                # no cache: submit to workers
-                if self.celery_connected:
-                    
-                    if self.script_engine_has_workers(requested_script) is False:
-                        raise HTTPException(500, detail=f'No workers available for cad script engine "{requested_script.script_cad_language}". Try again or report to the administrator!') # raise http exception to give server error
-
-                    task:AsyncResult = self.get_celery_task_method(requested_script).apply_async(args=[], kwargs={ 'script' : requested_script.json() })
-                    result_or_timeout = self.start_compute_wait_for_result_or_redirect(task)
-
-                    # wait time is over before compute could finish:
-                    if result_or_timeout is None:
-                        # no result
-                        return self.got_to_computing_job_url(requested_script, task.id)
-                    else:
-                        # check and handle 
-                       return self.handle_script_result(result_or_timeout)
+            # no cache: submit to workers
+            if self.celery_connected:
+                
+                if self.script_engine_has_workers(requested_script) is False:
+                    raise HTTPException(500, detail=f'No workers available for cad script engine "{requested_script.script_cad_language}". Try again or report to the administrator!') # raise http exception to give server error
+
+                task:AsyncResult = self.get_celery_task_method(requested_script).apply_async(args=[], kwargs={ 'script' : requested_script.json() })
+                result_or_timeout = self.start_compute_wait_for_result_or_redirect(task)
+
+                # wait time is over before compute could finish:
+                if result_or_timeout is None:
+                    # no result
+                    return self.got_to_computing_job_url(requested_script, task.id)
                 else:
-                    # local debug
-                    self.logger.warn('ModelRequestHandler::handle(): Compute request without celery connection. You are probably debugging?')
-                    return requested_script
+                    # check and handle 
+                   return self.handle_script_result(result_or_timeout)
+            else:
+                # local debug
+                self.logger.warn('ModelRequestHandler::handle(): Compute request without celery connection. You are probably debugging?')
+                return requested_script
 
     def start_compute_wait_for_result_or_redirect(self, task:AsyncResult, wait_time:int=None) -> CadScriptResult: # time in seconds
         """
@@ -371,7 +376,7 @@ class ModelRequestHandler():
         if script_request.params:
             for name, param in script_request.params.items():
                 related_filled_param = getattr(req, name, None)
-                if related_filled_param:
+                if related_filled_param is not None: # NOTE: values like False and 0 are part of the request too
                     filled_params[name] = ParamInstance(value=related_filled_param)
 
             script_request.request.params = filled_params
@@ -387,36 +392,3 @@ class ModelRequestHandler():
 
         return params
 
-
-    #### CACHE PRE-CALCULATION ####
-
-    async def compute_script_request(self, script:CadScriptRequest) -> CadScriptResult:
-
-        task:AsyncResult = self.get_celery_task_method(script).apply_async(args=[], kwargs={ 'script' : script.json() })
-        result_script_dict = await self.result_to_async(task)()
-        result_script = CadScriptResult(**result_script_dict)
-
-        return result_script
-
-
-    #### UTILS #### 
-        
-        
-    def _setup_logger(self):
-
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(level=logging.INFO)
-
-        try:
-            handler = logging.StreamHandler()
-            handler.setLevel(logging.INFO)
-            formatter = logging.Formatter('%(asctime)s %(name)s %(levelname)-4s %(message)s')
-            handler.setFormatter(formatter)
-
-            if (self.logger.hasHandlers()):  # see: http://tiny.cc/v5w6gz
-                self.logger.handlers.clear()
-
-            self.logger.addHandler(handler)
-
-        except Exception as e:
-            self.logger.error(e)
@@ -1,5 +1,5 @@
 import os
-import json # TODO: use orjson?
+import orjson
 import base64
 import time
 import random
@@ -36,7 +36,7 @@ os.chdir('/cqworkertmp')
 @celery.task(name='cadquery.compute', bind=True, delivery_mode=1) # delivery mode 1 for non persistence
 def compute_job_cadquery(self,script:str): # json of CadScript 
     time_start = time.time()
-    script_result = CadScriptResult(**json.loads(script)) # parse CadScriptRequest json as CadScciptResult
+    script_result = CadScriptResult(**orjson.loads(script)) # parse CadScriptRequest json as CadScciptResult
     result_response = ModelResult()
 
     #### REAL EXECUTION IN CADQUERY ####
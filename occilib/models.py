@@ -11,7 +11,14 @@
 from enum import Enum
 from typing import Any, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+import orjson
+
+#### SERIALIZATION ####
+
+def orjson_dumps(v, *, default) -> str:
+    """ Use orjson for Pydantic model.json(). orjson returns bytes, Pydantic expects str """
+    return orjson.dumps(v, default=default).decode()
 
 #### VALUE ENUMS  ####
 
@@ -100,14 +107,19 @@ class ModelRequestInput(BaseModel):
 
 
 class ModelResult(BaseModel):
+
+    class Config:
+        json_loads = orjson.loads
+        json_dumps = orjson_dumps
+
     id:str = None # name + param hash = instance hash
     success:bool = False
     task_id:str = None # set id of Celery task here
     request_id:str = None
-    models:dict = {} # TODO Output models by format
-    errors:List[Any] = []# TODO
-    messages:List[Any] = [] # TODO
-    tables:Any = [] # TODO
+    models:dict = Field(default_factory=dict) # TODO Output models by format
+    errors:List[Any] = Field(default_factory=list) # TODO
+    messages:List[Any] = Field(default_factory=list) # TODO
+    tables:Any = Field(default_factory=list) # TODO
     duration:int = None # in ms
 
 class SearchQueryInput(BaseModel):